@@ -349,6 +349,7 @@ REQUIRED = [
     ROOT / "step1_immutable_ALLINONE.py",
     ROOT / "step_2_helpers_FIXED.py",
     ROOT / "step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED.py",
+    ROOT / "conflict_scoring.py",
     ROOT / "step3_amivaia_filia_FIXED.py",
     ROOT / "step4_corrected.py",
     ROOT / "step5_enhanced.py",
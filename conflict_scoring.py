@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+conflict_scoring.py
+-------------------
+Κοινός υπολογισμός παιδαγωγικών συγκρούσεων για τα Βήματα 2 και 7.
+
+Η ποινή ενός ζεύγους μαθητών στο ίδιο τμήμα εξαρτάται ΜΟΝΟ από τις σημαίες τους
+(ζωηρός Z, ιδιαιτερότητα I):
+    I–I: 5,   I–Z (χωρίς I): 4,   Z–Z (χωρίς I): 3,   αλλιώς 0
+Άρα αρκούν τα πλήθη ανά τμήμα των κατηγοριών «Z και I», «μόνο I», «μόνο Z»
+(η τέταρτη, «κανένα», δεν συνεισφέρει) και οι συνδυασμοί C(n, 2), σε O(n)
+αντί για απαρίθμηση όλων των ζευγών.
+
+Κωδικοί τμήματος: ακέραιοι 0..num_classes-1, αρνητικός = χωρίς τμήμα (δεν μετράει).
+"""
+from typing import Tuple
+import numpy as np
+
+# Κατηγορίες σημαιών
+BOTH, I_ONLY, Z_ONLY, NONE = 0, 1, 2, 3
+
+
+def flag_category(z, i) -> int:
+    """Κατηγορία (BOTH / I_ONLY / Z_ONLY / NONE) ενός μαθητή."""
+    if i:
+        return BOTH if z else I_ONLY
+    return Z_ONLY if z else NONE
+
+
+def class_conflict_scores(both, i_only, z_only):
+    """
+    (ζεύγη με σύγκρουση, άθροισμα ποινών) ενός τμήματος από τα πλήθη κατηγοριών.
+    Δουλεύει και στοιχείο-προς-στοιχείο σε πίνακες NumPy ίδιου σχήματος.
+    """
+    with_i = both + i_only
+    flagged = with_i + z_only
+    ped_pairs = flagged * (flagged - 1) // 2
+    penalty = 5 * (with_i * (with_i - 1) // 2) + 4 * with_i * z_only + 3 * (z_only * (z_only - 1) // 2)
+    return ped_pairs, penalty
+
+
+def category_counts_many(class_codes, z, i, num_classes: int) -> np.ndarray:
+    """
+    Πλήθη κατηγοριών ανά σενάριο και τμήμα: πίνακας (S, 3, num_classes).
+
+    class_codes: (S, n) ή (n,) κωδικοί τμήματος ανά σενάριο (αρνητικός = εκτός)
+    z, i:        (n,) σημαίες ζωηρού / ιδιαιτερότητας των μαθητών
+    """
+    codes = np.atleast_2d(np.asarray(class_codes, dtype=np.int64))
+    z = np.asarray(z, dtype=bool)
+    i = np.asarray(i, dtype=bool)
+    n_scen = codes.shape[0]
+    category = np.where(i, np.where(z, BOTH, I_ONLY), np.where(z, Z_ONLY, NONE))
+
+    placed = (codes >= 0) & (codes < num_classes) & (category < NONE)[None, :]
+    scen = np.broadcast_to(np.arange(n_scen)[:, None], codes.shape)
+    cat = np.broadcast_to(category[None, :], codes.shape)
+    flat = (scen[placed] * 3 + cat[placed]) * num_classes + codes[placed]
+    counts = np.bincount(flat, minlength=n_scen * 3 * num_classes)
+    return counts.reshape(n_scen, 3, num_classes)
+
+
+def conflict_scores_many(class_codes, z, i, num_classes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Διανυσματική βαθμολόγηση πολλών κατανομών μαζί.
+    Επιστρέφει (ped_conflicts, penalty), πίνακες μήκους S (ένα στοιχείο ανά σενάριο).
+    """
+    counts = category_counts_many(class_codes, z, i, num_classes)
+    ped, penalty = class_conflict_scores(counts[:, BOTH], counts[:, I_ONLY], counts[:, Z_ONLY])
+    return ped.sum(axis=1), penalty.sum(axis=1)
+
+
+def conflict_scores(class_codes, z, i, num_classes: int) -> Tuple[int, int]:
+    """(ped_conflicts, penalty) μίας κατανομής (class_codes μήκους n)."""
+    ped, penalty = conflict_scores_many(np.asarray(class_codes)[None, :], z, i, num_classes)
+    return int(ped[0]), int(penalty[0])
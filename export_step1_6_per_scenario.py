@@ -33,7 +33,9 @@ def _dedup(df: pd.DataFrame) -> pd.DataFrame:
         df = df.loc[:, ~df.columns.duplicated(keep="first")]
     return df
 
-def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4: str = "best") -> None:
+def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4: str = "best",
+                               step1_cache_dir: Optional[str] = None) -> None:
+    """step1_cache_dir: κατάλογος cache του Βήματος 1 (default: cache του χρήστη, βλ. Step1ResultsCache)."""
     root = Path(__file__).parent
     
     # Import όλων των modules
@@ -55,8 +57,9 @@ def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4:
     xls = pd.ExcelFile(input_excel)
     df0 = xls.parse(xls.sheet_names[0])
 
-    # STEP 1
-    df1, _ = m_step1.create_immutable_step1(df0, num_classes=None)
+    # STEP 1 (με cache: ίδιος κατάλογος -> χωρίς νέα απαρίθμηση)
+    step1_cache = m_step1.Step1ResultsCache(step1_cache_dir)
+    df1, _ = m_step1.create_immutable_step1(df0, num_classes=None, cache=step1_cache)
 
     # Κενά -> NaN
     for c in [c for c in df1.columns if str(c).startswith("ΒΗΜΑ1_ΣΕΝΑΡΙΟ_")]:
@@ -20,14 +20,21 @@ from pathlib import Path
 είναι ΟΡΙΣΤΙΚΕΣ και δεν αλλάζουν ποτέ στα επόμενα βήματα.
 """
 
-from dataclasses import dataclass, field
-from typing import Dict, List, Set, Tuple, Optional, FrozenSet
+from collections.abc import Mapping
+from dataclasses import FrozenInstanceError, dataclass, field, replace
+from typing import Callable, Dict, Iterator, List, Set, Tuple, Optional, FrozenSet, Union
 import pandas as pd
 import numpy as np
+import hashlib
+import heapq
 import itertools
+import json
 import math
+import os
 import re
 import ast
+import tempfile
+import time
 from pathlib import Path
 
 
@@ -50,14 +57,125 @@ class Step1Scenario:
         return [name for name, cls in self.assignments.items() if cls == class_name]
 
 
+class _CompactAssignments(Mapping):
+    """Read-only όψη όνομα -> τμήμα πάνω στους κωδικούς ενός CompactStep1Scenario (χωρίς dict)"""
+    __slots__ = ("_index", "_codes", "_labels")
+
+    def __init__(self, index: Dict[str, int], codes: np.ndarray, labels: Tuple[str, ...]):
+        self._index = index
+        self._codes = codes
+        self._labels = labels
+
+    def __getitem__(self, name: str) -> str:
+        return self._labels[self._codes[self._index[name]]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class CompactStep1Scenario:
+    """
+    Immutable σενάριο βήματος 1 με ανάθεση ως πίνακα int8 (κωδικός τμήματος ανά θέση
+    του teacher_kids) αντί για Dict[str, str]. Ίδιο API με το Step1Scenario· το
+    assignments είναι lazy όψη Mapping, οι αναζητήσεις ανά τμήμα και η μέτρηση
+    σπασμένων φιλιών γίνονται διανυσματικά.
+    """
+    __slots__ = ("id", "column_name", "codes", "teacher_kids", "class_labels",
+                 "description", "broken_friendships", "metadata", "_index")
+
+    def __init__(self, id: int, column_name: str, codes, teacher_kids: Tuple[str, ...],
+                 class_labels: Tuple[str, ...], description: str, broken_friendships: int,
+                 metadata: Optional[Dict[str, any]] = None,
+                 index: Optional[Dict[str, int]] = None):
+        codes = np.array(codes, dtype=np.int8)
+        codes.flags.writeable = False
+        if len(codes) != len(teacher_kids):
+            raise ValueError("Οι κωδικοί δεν αντιστοιχούν στα παιδιά εκπαιδευτικών")
+        if index is None:
+            index = {name: i for i, name in enumerate(teacher_kids)}
+        for name, value in (("id", id), ("column_name", column_name), ("codes", codes),
+                            ("teacher_kids", tuple(teacher_kids)), ("class_labels", tuple(class_labels)),
+                            ("description", description), ("broken_friendships", broken_friendships),
+                            ("metadata", dict(metadata or {})), ("_index", index)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+    def __repr__(self) -> str:
+        return (f"CompactStep1Scenario(id={self.id!r}, column_name={self.column_name!r}, "
+                f"students={len(self.codes)}, broken_friendships={self.broken_friendships!r})")
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (CompactStep1Scenario, Step1Scenario)):
+            return (self.id == other.id and self.column_name == other.column_name
+                    and self.description == other.description
+                    and self.broken_friendships == other.broken_friendships
+                    and dict(self.assignments) == dict(other.assignments))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Το __setattr__ απαγορεύεται: pickle/deepcopy ξαναχτίζουν μέσω του constructor
+        return (CompactStep1Scenario, (self.id, self.column_name, self.codes, self.teacher_kids,
+                                       self.class_labels, self.description, self.broken_friendships,
+                                       self.metadata))
+
+    @classmethod
+    def from_scenario(cls, scenario: Step1Scenario, teacher_kids: Tuple[str, ...],
+                      class_labels: Tuple[str, ...],
+                      index: Optional[Dict[str, int]] = None) -> "CompactStep1Scenario":
+        """Μετατροπή Step1Scenario (dict) σε συμπαγή μορφή"""
+        label_code = {label: c for c, label in enumerate(class_labels)}
+        codes = [label_code[scenario.assignments[name]] for name in teacher_kids]
+        return cls(scenario.id, scenario.column_name, codes, teacher_kids, class_labels,
+                   scenario.description, scenario.broken_friendships, scenario.metadata, index)
+
+    def to_scenario(self) -> Step1Scenario:
+        """Μετατροπή σε Step1Scenario (dict)"""
+        return Step1Scenario(id=self.id, column_name=self.column_name, assignments=dict(self.assignments),
+                             description=self.description, broken_friendships=self.broken_friendships,
+                             metadata=dict(self.metadata))
+
+    @property
+    def assignments(self) -> Mapping:
+        return _CompactAssignments(self._index, self.codes, self.class_labels)
+
+    def get_assignment(self, student_name: str) -> Optional[str]:
+        """Read-only πρόσβαση σε ανάθεση"""
+        pos = self._index.get(student_name)
+        return None if pos is None else self.class_labels[self.codes[pos]]
+
+    def get_students_in_class(self, class_name: str) -> List[str]:
+        """Επιστρέφει λίστα μαθητών σε τμήμα"""
+        try:
+            code = self.class_labels.index(class_name)
+        except ValueError:
+            return []
+        return [self.teacher_kids[pos] for pos in np.flatnonzero(self.codes == code)]
+
+    def count_broken(self, pairs: np.ndarray) -> int:
+        """Σπασμένες φιλίες για πίνακα ζευγών θέσεων E×2 (δες Step1Results.friendship_positions)"""
+        pairs = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+        return int(np.count_nonzero(self.codes[pairs[:, 0]] != self.codes[pairs[:, 1]]))
+
+
 @dataclass(frozen=True)
 class Step1Results:
     """Immutable αποτελέσματα βήματος 1"""
-    scenarios: Tuple[Step1Scenario, ...]
+    scenarios: Tuple[Union[Step1Scenario, CompactStep1Scenario], ...]
     friendships: FrozenSet[Tuple[str, str]]
     teacher_kids: Tuple[str, ...]
     num_classes: int
     creation_timestamp: str
+    exhaustive: bool = True  # False: η αναζήτηση σταμάτησε στο όριο (budget)
     
     def get_scenario(self, scenario_id: int) -> Optional[Step1Scenario]:
         """Επιστρέφει σενάριο με βάση ID"""
@@ -73,20 +191,30 @@ class Step1Results:
                 return scenario
         return None
     
+    def friendship_positions(self) -> np.ndarray:
+        """Αμοιβαίες φιλίες ως πίνακας E×2 θέσεων στο teacher_kids (για CompactStep1Scenario.count_broken)"""
+        index = {name: i for i, name in enumerate(self.teacher_kids)}
+        pairs = [(index[a], index[b]) for a, b in self.friendships if a in index and b in index]
+        return np.array(pairs, dtype=np.intp).reshape(-1, 2)
+
     def validate_immutability(self, df: pd.DataFrame) -> bool:
         """Ελέγχει ότι οι στήλες ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X δεν έχουν αλλάξει"""
+        first_row: Optional[Dict[str, int]] = None  # όνομα -> θέση πρώτης γραμμής (μία φορά)
         for scenario in self.scenarios:
             col_name = scenario.column_name
             if col_name not in df.columns:
                 raise ValueError(f"Λείπει στήλη {col_name} - παραβίαση immutability")
             
             # Έλεγχος ότι οι αναθέσεις είναι οι αναμενόμενες
+            if first_row is None:
+                first_row = _first_row_positions(df["ΟΝΟΜΑ"])
+            values = df[col_name].to_numpy()
             for student_name, expected_class in scenario.assignments.items():
-                student_row = df[df["ΟΝΟΜΑ"] == student_name]
-                if student_row.empty:
+                pos = first_row.get(student_name)
+                if pos is None:
                     continue
                 
-                actual_class = student_row[col_name].iloc[0]
+                actual_class = values[pos]
                 if pd.notna(actual_class) and str(actual_class).strip() != expected_class:
                     raise ValueError(
                         f"ΠΑΡΑΒΙΑΣΗ IMMUTABILITY: {student_name} σε {col_name} "
@@ -94,16 +222,222 @@ class Step1Results:
                     )
         return True
 
+    def to_dict(self) -> Dict[str, any]:
+        """Σειριοποίηση σε JSON-συμβατό dict"""
+        return {
+            "scenarios": [_scenario_to_dict(s) for s in self.scenarios],
+            "friendships": sorted(list(pair) for pair in self.friendships),
+            "teacher_kids": list(self.teacher_kids),
+            "num_classes": self.num_classes,
+            "creation_timestamp": self.creation_timestamp,
+            "exhaustive": self.exhaustive,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> "Step1Results":
+        """Αντίστροφο του to_dict"""
+        return cls(
+            scenarios=tuple(_scenario_from_dict(s, tuple(data["teacher_kids"])) for s in data["scenarios"]),
+            friendships=frozenset(tuple(pair) for pair in data["friendships"]),
+            teacher_kids=tuple(data["teacher_kids"]),
+            num_classes=int(data["num_classes"]),
+            creation_timestamp=data["creation_timestamp"],
+            exhaustive=bool(data.get("exhaustive", True)),
+        )
+
+
+def _scenario_to_dict(s: Union[Step1Scenario, CompactStep1Scenario]) -> Dict[str, any]:
+    data = {
+        "id": s.id,
+        "column_name": s.column_name,
+        "description": s.description,
+        "broken_friendships": s.broken_friendships,
+        "metadata": dict(s.metadata),
+    }
+    if isinstance(s, CompactStep1Scenario):
+        data["codes"] = s.codes.tolist()
+        data["class_labels"] = list(s.class_labels)
+    else:
+        data["assignments"] = dict(s.assignments)
+    return data
+
+
+def _scenario_from_dict(data: Dict[str, any], teacher_kids: Tuple[str, ...]) -> Union[Step1Scenario, CompactStep1Scenario]:
+    if "codes" in data:
+        return CompactStep1Scenario(
+            id=data["id"], column_name=data["column_name"], codes=data["codes"],
+            teacher_kids=teacher_kids, class_labels=tuple(data["class_labels"]),
+            description=data["description"], broken_friendships=data["broken_friendships"],
+            metadata=data.get("metadata"),
+        )
+    return Step1Scenario(**data)
+
+
+@dataclass(frozen=True)
+class Step1Budget:
+    """Όριο αναζήτησης Κανόνα 2: δευτερόλεπτα ή/και κόμβοι (None = χωρίς όριο)"""
+    seconds: Optional[float] = None
+    nodes: Optional[int] = None
+
+
+class _SearchMonitor:
+    """Μετρά κόμβους/χρόνο της απαρίθμησης, ειδοποιεί το progress και σταματά στο budget"""
+
+    CHECK_EVERY = 1024  # έλεγχος ρολογιού/progress ανά τόσους κόμβους
+
+    def __init__(self, budget: Optional[Step1Budget] = None,
+                 progress: Optional[Callable[[int, float], None]] = None):
+        self.budget = budget or Step1Budget()
+        self.progress = progress
+        self.started = time.monotonic()
+        self.nodes = 0
+        self.exhausted = False
+
+    def tick(self) -> bool:
+        """Ένας ακόμη κόμβος. False όταν εξαντληθεί το budget (και από εκεί και πέρα)."""
+        if self.exhausted:
+            return False
+        self.nodes += 1
+        if self.budget.nodes is not None and self.nodes > self.budget.nodes:
+            self.exhausted = True
+            return False
+        if self.nodes % self.CHECK_EVERY == 0:
+            elapsed = time.monotonic() - self.started
+            if self.progress is not None:
+                self.progress(self.nodes, elapsed)
+            if self.budget.seconds is not None and elapsed > self.budget.seconds:
+                self.exhausted = True
+                return False
+        return True
+
+    def finish(self) -> None:
+        if self.progress is not None:
+            self.progress(self.nodes, time.monotonic() - self.started)
+
+
+class Step1ResultsCache:
+    """
+    Μόνιμη cache (στο δίσκο) για Step1Results.
+
+    Κλειδί: SHA-256 των (έκδοση αλγορίθμου, παιδιά εκπαιδευτικών ΜΕ τη σειρά εισόδου, αμοιβαίες
+    φιλίες, num_classes), οπότε επανεκτέλεση ή νέο ανέβασμα του ίδιου καταλόγου δεν ξανατρέχει
+    την απαρίθμηση. Η σειρά μετρά: ο round-robin του Κανόνα 1 και η ονομασία τμημάτων (RGS)
+    εξαρτώνται από αυτήν. Αλλαγή στην αναζήτηση => νέο ALGORITHM_VERSION => παλιές εγγραφές αγνοούνται.
+    Ένα αρχείο JSON ανά κλειδί· όταν το σύνολο ξεπεράσει max_bytes, διαγράφονται πρώτα
+    τα λιγότερο πρόσφατα χρησιμοποιημένα (LRU βάσει mtime, που ανανεώνεται σε κάθε hit).
+    """
+
+    ALGORITHM_VERSION = "step1-bnb-components-1"
+
+    def __init__(self, directory=None, max_bytes: int = 50 * 1024 * 1024):
+        self.directory = Path(directory) if directory is not None else self.default_directory()
+        self.max_bytes = int(max_bytes)
+
+    @staticmethod
+    def default_directory() -> Path:
+        """Κατάλογος cache του χρήστη ($XDG_CACHE_HOME ή ~/.cache), όχι μέσα στο πακέτο."""
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return Path(base) / "step1_immutable"
+
+    @classmethod
+    def make_key(cls, teacher_kids, friendships, num_classes: int) -> str:
+        payload = json.dumps(
+            {
+                "algorithm": cls.ALGORITHM_VERSION,
+                "teacher_kids": [str(k) for k in teacher_kids],
+                "friendships": sorted(sorted(str(x) for x in pair) for pair in friendships),
+                "num_classes": int(num_classes),
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Step1Results]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                results = Step1Results.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            # Κατεστραμμένη εγγραφή: αγνοείται και διαγράφεται
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)  # LRU: σημείωση πρόσφατης χρήσης
+        except OSError:
+            pass
+        return results
+
+    def put(self, key: str, results: Step1Results) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(results.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+
 
 class Step1ImmutableProcessor:
     """Επεξεργαστής που εξασφαλίζει immutability του Βήματος 1"""
+
+    # Μέγιστες τοποθετήσεις (num_classes ** μέγεθος) της μεγαλύτερης συνιστώσας φιλιών
+    # για να χρησιμοποιηθεί η αποσύνθεση ανά συνιστώσα αντί για το ενιαίο branch-and-bound
+    COMPONENT_PLACEMENTS_LIMIT = 200_000
     
     def __init__(self):
         self._results: Optional[Step1Results] = None
         self._is_locked: bool = False
+        # (ονόματα, πίνακας ακμών E×2) αμοιβαίων φιλιών από matrix-style φύλλο
+        self._friendship_edges: Optional[Tuple[np.ndarray, np.ndarray]] = None
     
-    def create_scenarios(self, df: pd.DataFrame, num_classes: Optional[int] = None) -> Step1Results:
-        """Δημιουργία immutable σεναρίων"""
+    def create_scenarios(self, df: pd.DataFrame, num_classes: Optional[int] = None,
+                         cache: Optional[Step1ResultsCache] = None,
+                         budget: Union[Step1Budget, float, None] = None,
+                         progress: Optional[Callable[[int, float], None]] = None,
+                         compact: bool = False) -> Step1Results:
+        """
+        Δημιουργία immutable σεναρίων (με προαιρετική cache στο δίσκο).
+
+        budget: Step1Budget ή σκέτος αριθμός (δευτερόλεπτα). Όταν εξαντληθεί, κρατούνται
+        τα καλύτερα σενάρια που βρέθηκαν και το Step1Results.exhaustive γίνεται False.
+        progress: callback(κόμβοι, δευτερόλεπτα) κατά τη διάρκεια της απαρίθμησης.
+        compact: σενάρια CompactStep1Scenario (κωδικοί int8) αντί για Step1Scenario (dict).
+        Η αναζήτηση κρατά ούτως ή άλλως τις υποψήφιες κατανομές ως tuples κωδικών· το compact
+        ορίζει μόνο τη μορφή των σεναρίων που κρατούνται (χωρίς ενδιάμεσα dict ανά όνομα).
+        """
         if self._is_locked:
             raise RuntimeError("Step1 είναι ήδη κλειδωμένο - δεν επιτρέπονται αλλαγές")
         
@@ -133,8 +467,28 @@ class Step1ImmutableProcessor:
         # Εξαγωγή φιλιών
         friendships = self._extract_friendships(df_norm, teacher_kids)
         
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(teacher_kids, friendships, num_classes)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print(f"Βρέθηκαν αποθηκευμένα σενάρια (cache {cache_key[:12]}) - χωρίς απαρίθμηση")
+                # Η cache κρατά τη μορφή της εκτέλεσης που τη γέμισε: μετατροπή στη ζητούμενη
+                cached = replace(cached, scenarios=self._convert_scenarios(cached.scenarios, teacher_kids,
+                                                                           num_classes, compact))
+                self._results = cached
+                return self._results
+        
         # Δημιουργία σεναρίων
-        scenarios = self._generate_scenarios(teacher_kids, num_classes, friendships)
+        if budget is not None and not isinstance(budget, Step1Budget):
+            budget = Step1Budget(seconds=float(budget))
+        monitor = _SearchMonitor(budget, progress)
+        scenarios = self._generate_scenarios(teacher_kids, num_classes, friendships, monitor,
+                                             compact=compact)
+        monitor.finish()
+        if monitor.exhausted:
+            print(f"Όριο αναζήτησης: σταμάτησε μετά από {monitor.nodes:,} κόμβους - "
+                  f"κρατούνται τα καλύτερα σενάρια που βρέθηκαν")
         
         # Δημιουργία immutable αποτελεσμάτων
         self._results = Step1Results(
@@ -142,29 +496,75 @@ class Step1ImmutableProcessor:
             friendships=friendships,
             teacher_kids=tuple(teacher_kids),
             num_classes=num_classes,
-            creation_timestamp=pd.Timestamp.now().isoformat()
+            creation_timestamp=pd.Timestamp.now().isoformat(),
+            exhaustive=not monitor.exhausted
         )
         
+        if cache is not None and self._results.exhaustive:
+            try:
+                cache.put(cache_key, self._results)
+            except (OSError, TypeError, ValueError) as e:
+                # π.χ. μη σειριοποιήσιμο περιεχόμενο· το put έχει ήδη σβήσει το προσωρινό αρχείο
+                print(f"Αδυναμία αποθήκευσης στην cache: {e}")
+        
         print(f"Δημιουργήθηκαν {len(scenarios)} immutable σενάρια")
         return self._results
     
-    def apply_to_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Εφαρμόζει τα σενάρια στο DataFrame ΚΑΙ το κλειδώνει"""
+    def _convert_scenarios(self, scenarios, teacher_kids: List[str], num_classes: int,
+                           compact: bool) -> Tuple[Union[Step1Scenario, CompactStep1Scenario], ...]:
+        """
+        Σενάρια στη ζητούμενη μορφή: CompactStep1Scenario (κοινό ευρετήριο ονομάτων) με
+        compact=True, αλλιώς Step1Scenario (dict).
+        """
+        if not compact:
+            return tuple(s.to_scenario() if isinstance(s, CompactStep1Scenario) else s for s in scenarios)
+        kids = tuple(teacher_kids)
+        labels = tuple(f"Α{i+1}" for i in range(num_classes))
+        index = {name: i for i, name in enumerate(kids)}
+        return tuple(
+            s if isinstance(s, CompactStep1Scenario)
+            else CompactStep1Scenario.from_scenario(s, kids, labels, index)
+            for s in scenarios
+        )
+    
+    def apply_to_dataframe(self, df: pd.DataFrame, categorical: bool = False) -> pd.DataFrame:
+        """
+        Εφαρμόζει τα σενάρια στο DataFrame ΚΑΙ το κλειδώνει.
+
+        Το ευρετήριο όνομα -> γραμμές χτίζεται μία φορά και όλες οι στήλες ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X
+        γράφονται μαζί. Με categorical=True οι στήλες είναι Categorical (ακέραιοι κωδικοί
+        int8 με κατηγορίες "", Α1, Α2, ...) αντί για στήλες object.
+        """
         if not self._results:
             raise RuntimeError("Δεν έχουν δημιουργηθεί σενάρια ακόμη")
         
         result_df = df.copy()
         
-        # Προσθήκη στηλών ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X
+        # Ευρετήριο: κάθε γραμμή -> κωδικός ονόματος, κάθε παιδί εκπαιδευτικού -> κωδικός
+        row_codes, unique_names = pd.factorize(result_df["ΟΝΟΜΑ"])
+        kids = list(self._results.teacher_kids)
+        kid_codes = unique_names.get_indexer(kids)
+        present = kid_codes >= 0
+        class_labels = [""] + [f"Α{i+1}" for i in range(self._results.num_classes)]
+        
+        # Προσθήκη στηλών ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X (κενό για όσους δεν είναι παιδιά εκπαιδευτικών)
+        new_columns = {}
         for scenario in self._results.scenarios:
-            col_name = scenario.column_name
-            result_df[col_name] = ""  # Αρχικοποίηση με κενές τιμές
-            
-            # Συμπλήρωση μόνο για παιδιά εκπαιδευτικών
-            for student_name, class_assigned in scenario.assignments.items():
-                mask = result_df["ΟΝΟΜΑ"] == student_name
-                if mask.any():
-                    result_df.loc[mask, col_name] = class_assigned
+            # +1 θέση κενή: οι γραμμές χωρίς όνομα (κωδικός -1) παίρνουν ""
+            per_name = np.full(len(unique_names) + 1, "", dtype=object)
+            if isinstance(scenario, CompactStep1Scenario):
+                labels = np.array(scenario.class_labels, dtype=object)
+                per_name[kid_codes[present]] = labels[scenario.codes[present]]
+            else:
+                per_name[kid_codes[present]] = [
+                    scenario.assignments.get(name, "") for name, ok in zip(kids, present) if ok
+                ]
+            values = per_name[row_codes]
+            if categorical:
+                new_columns[scenario.column_name] = pd.Categorical(values, categories=class_labels)
+            else:
+                new_columns[scenario.column_name] = values
+        result_df = result_df.assign(**new_columns)
         
         # ΚΛΕΙΔΩΜΑ - μετά από αυτό δεν επιτρέπονται αλλαγές
         self._is_locked = True
@@ -176,6 +576,13 @@ class Step1ImmutableProcessor:
         """Read-only πρόσβαση στα αποτελέσματα"""
         return self._results
     
+    def get_friendship_edges(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Read-only πρόσβαση στις αμοιβαίες φιλίες ΟΛΩΝ των μαθητών (matrix-style είσοδος):
+        (ονόματα, ακμές E×2 με δείκτες στα ονόματα, i < j). None για είσοδο με στήλη ΦΙΛΟΙ.
+        """
+        return self._friendship_edges
+    
     def is_locked(self) -> bool:
         """Έλεγχος αν το Step1 είναι κλειδωμένο"""
         return self._is_locked
@@ -257,18 +664,17 @@ class Step1ImmutableProcessor:
         if friendship_cols:
             print(f"Εντοπίστηκαν {len(friendship_cols)} στήλες φιλιών (matrix-style)")
             
-            for col in friendship_cols:
-                friend_name = str(col).strip()
-                if friend_name in teacher_kids_set:
-                    # Βρες ποια παιδιά εκπαιδευτικών έχουν γράψει το friend_name ως φίλο
-                    friend_mask = (df["ΟΝΟΜΑ"].isin(teacher_kids)) & (df[col].map(self._norm_yesno) == "Ν")
-                    students_who_wrote_this_friend = df[friend_mask]["ΟΝΟΜΑ"].tolist()
-                    
-                    for student in students_who_wrote_this_friend:
-                        if student != friend_name:  # Όχι φιλία με τον εαυτό του
-                            if student not in student_friends:
-                                student_friends[student] = set()
-                            student_friends[student].add(friend_name)
+            # Ένα πέρασμα: boolean πίνακας γειτνίασης, αμοιβαίες φιλίες = A & A.T
+            names, adjacency = friendship_adjacency(df, friendship_cols)
+            edges = mutual_friendship_edges(adjacency)
+            self._friendship_edges = (names, edges)
+            
+            is_kid = np.isin(names, list(teacher_kids_set))
+            kid_edges = edges[is_kid[edges[:, 0]] & is_kid[edges[:, 1]]]
+            for i, j in kid_edges.tolist():
+                # Κάθε ακμή είναι ήδη αμοιβαία: A→B ΚΑΙ B→A
+                student_friends.setdefault(names[i], set()).add(names[j])
+                student_friends.setdefault(names[j], set()).add(names[i])
         
         # ΜΕΘΟΔΟΣ 2: Single-column ΦΙΛΟΙ (fallback)
         elif "ΦΙΛΟΙ" in df.columns:
@@ -319,134 +725,511 @@ class Step1ImmutableProcessor:
                 broken += 1
         return broken
     
-    def _canonical_key(self, names: List[str], assign_map: Dict[str, str], class_labels_list: List[str]) -> Tuple:
-        """Canonical key για αποφυγή duplicates"""
-        buckets = []
-        for c in class_labels_list:
-            members = tuple(sorted([n for n in names if assign_map.get(n) == c]))
-            buckets.append(members)
-        return tuple(sorted(buckets))
-    
     def _generate_scenarios(self, teacher_kids: List[str], num_classes: int, 
-                          friendships: FrozenSet[Tuple[str, str]]) -> List[Step1Scenario]:
-        """Δημιουργία σεναρίων με immutable structure"""
+                          friendships: FrozenSet[Tuple[str, str]],
+                          monitor: Optional[_SearchMonitor] = None,
+                          compact: bool = False) -> List[Union[Step1Scenario, CompactStep1Scenario]]:
+        """
+        Δημιουργία σεναρίων με immutable structure.
+
+        Οι κατανομές παράγονται ως tuples κωδικών τμήματος (σειρά teacher_kids)· με
+        compact=True γίνονται απευθείας CompactStep1Scenario, αλλιώς Step1Scenario (dict).
+        """
         class_labels_list = [f"Α{i+1}" for i in range(num_classes)]
+        kids = tuple(teacher_kids)
+        labels = tuple(class_labels_list)
+        index = {name: i for i, name in enumerate(kids)}
+
+        def make(scenario_id: int, codes: Tuple[int, ...], description: str, broken: int):
+            column_name = f"ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{scenario_id}"
+            if compact:
+                return CompactStep1Scenario(scenario_id, column_name, codes, kids, labels,
+                                            description, broken, index=index)
+            return Step1Scenario(
+                id=scenario_id,
+                column_name=column_name,
+                assignments={name: class_labels_list[c] for name, c in zip(kids, codes)},
+                description=description,
+                broken_friendships=broken
+            )
+
         scenarios = []
         
         if len(teacher_kids) <= num_classes:
             # ΚΑΝΟΝΑΣ 1: Σειριακή κατανομή
             print(f"Εφαρμογή Κανόνα 1 (≤1 ανά τμήμα)")
-            assignments = {}
-            
-            for i, name in enumerate(teacher_kids):
-                assignments[name] = class_labels_list[i % num_classes]
-            
-            scenario = Step1Scenario(
-                id=1,
-                column_name="ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1",
-                assignments=assignments,
-                description="Κανόνας 1: Σειριακή κατανομή ≤1/τμήμα",
-                broken_friendships=0
-            )
-            scenarios.append(scenario)
+            codes = tuple(i % num_classes for i in range(len(teacher_kids)))
+            scenarios.append(make(1, codes, "Κανόνας 1: Σειριακή κατανομή ≤1/τμήμα", 0))
         else:
             # ΚΑΝΟΝΑΣ 2: Εξαντλητική παραγωγή
             print(f"Εφαρμογή Κανόνα 2 (εξαντλητική με φιλίες)")
-            valid_assignments = self._exhaustive_generation(teacher_kids, num_classes, friendships)
+            components = self._friendship_components(teacher_kids, friendships)
+            largest = max(len(comp) for comp in components)
+            if len(components) > 1 and num_classes ** largest <= self.COMPONENT_PLACEMENTS_LIMIT:
+                valid_assignments = self._component_generation(teacher_kids, num_classes, friendships,
+                                                               components, monitor=monitor)
+            else:
+                valid_assignments = self._exhaustive_generation(teacher_kids, num_classes, friendships,
+                                                                monitor=monitor)
+            
+            if not valid_assignments and monitor is not None and monitor.exhausted:
+                # Τίποτα μέσα στο όριο: σειριακή (ισόρροπη) κατανομή ως ελάχιστο αποτέλεσμα
+                fallback = tuple(i % num_classes for i in range(len(teacher_kids)))
+                fallback_map = {name: class_labels_list[c] for name, c in zip(kids, fallback)}
+                valid_assignments = [(fallback, self._count_broken_friendships(teacher_kids, fallback_map, friendships))]
             
-            for i, (assignments_dict, broken_count) in enumerate(valid_assignments[:5], 1):
-                scenario = Step1Scenario(
-                    id=i,
-                    column_name=f"ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{i}",
-                    assignments=assignments_dict,
-                    description="Κανόνας 2: Ισόρροπη κατανομή",
-                    broken_friendships=broken_count
-                )
-                scenarios.append(scenario)
+            for i, (codes, broken_count) in enumerate(valid_assignments[:5], 1):
+                scenarios.append(make(i, codes, "Κανόνας 2: Ισόρροπη κατανομή", broken_count))
         
         return scenarios
     
-    def _exhaustive_generation(self, teacher_kids: List[str], num_classes: int, 
-                             friendships: FrozenSet[Tuple[str, str]]) -> List[Tuple[Dict[str, str], int]]:
-        """Εξαντλητική παραγωγή σεναρίων"""
-        class_labels_list = [f"Α{i+1}" for i in range(num_classes)]
-        valid_scenarios = []
-        seen_canonical = set()
-        
+    def _balanced_partitions(self, n: int, num_classes: int,
+                             earlier_friends: Optional[List[List[int]]] = None,
+                             cutoff: Optional[Callable[[], Optional[int]]] = None,
+                             stats: Optional[Dict[str, int]] = None,
+                             start_counts: Optional[List[int]] = None,
+                             monitor: Optional[_SearchMonitor] = None):
+        """
+        Παράγει απευθείας ΜΟΝΟ τις έγκυρες κατανομές n παιδιών σε num_classes τμήματα:
+          • ισοκατανομή (max-min ≤ 1)
+          • όχι όλα στο ίδιο τμήμα
+          • μία φορά ανά διαμέριση (χωρίς συμμετρίες ετικετών)
+
+        Κάθε κατανομή είναι tuple δεικτών τμήματος σε μορφή restricted growth string:
+        το παιδί i μπαίνει σε ήδη ανοιγμένο τμήμα ή ανοίγει το ΕΠΟΜΕΝΟ νέο. Έτσι κάθε
+        διαμέριση εμφανίζεται ακριβώς μία φορά, με τη λεξικογραφικά μικρότερη ονομασία
+        τμημάτων και σε λεξικογραφική σειρά.
+
+        Επιστρέφει ζεύγη (assignment, broken). Τα σπασμένα ζεύγη μετρώνται σταδιακά από
+        το earlier_friends[i] (φίλοι του i με μικρότερο δείκτη). Αν δοθεί cutoff, κάθε
+        μερική ανάθεση με σπασμένα ≥ cutoff() κλαδεύεται (branch-and-bound)· το stats["min_pruned"]
+        κρατά το μικρότερο τέτοιο κάτω φράγμα.
+
+        Με start_counts η κατανομή συνεχίζει από ήδη γεμάτα τμήματα (πρώτα τα μη κενά):
+        η ισοκατανομή ελέγχεται στο σύνολο start_counts + n.
+        Με monitor η παραγωγή σταματά όταν εξαντληθεί το budget.
+        """
+        start = list(start_counts) if start_counts is not None else [0] * num_classes
+        total = n + sum(start)
+        if total == 0 or num_classes < 2:
+            return
+        if earlier_friends is None:
+            earlier_friends = [[] for _ in range(n)]
+        if stats is None:
+            stats = {}
+        stats.setdefault("nodes", 0)
+        stats.setdefault("pruned", 0)
+
+        q, r = divmod(total, num_classes)
+        cap = q + (1 if r else 0)
+        counts = start
+        assignment = [0] * n
+        used = sum(1 for c in counts if c)                    # πόσα τμήματα έχουν ανοίξει
+        full = sum(1 for c in counts if r and c == cap)       # τμήματα με q+1 (το πολύ r)
+        deficit = sum(max(0, q - c) for c in counts)          # θέσεις ώσπου κάθε τμήμα να φτάσει q
+
+        def place(i: int, broken: int):
+            nonlocal used, full, deficit
+            if i == n:
+                if used > 1:
+                    yield tuple(assignment), broken
+                return
+
+            remaining_after = n - i - 1
+            limit = cutoff() if cutoff is not None else None
+            for c in range(min(used + 1, num_classes)):
+                cnt = counts[c]
+                if cnt >= cap:
+                    continue
+                if r and cnt + 1 == cap and full >= r:
+                    continue
+                gain = 1 if cnt < q else 0
+                if deficit - gain > remaining_after:
+                    continue
+
+                new_broken = broken
+                for j in earlier_friends[i]:
+                    if assignment[j] != c:
+                        new_broken += 1
+                if limit is not None and new_broken >= limit:
+                    stats["pruned"] += 1
+                    if stats.get("min_pruned") is None or new_broken < stats["min_pruned"]:
+                        stats["min_pruned"] = new_broken
+                    continue
+
+                if monitor is not None and not monitor.tick():
+                    return
+                stats["nodes"] += 1
+                opened = c == used
+                counts[c] += 1
+                assignment[i] = c
+                deficit -= gain
+                if r and counts[c] == cap:
+                    full += 1
+                if opened:
+                    used += 1
+
+                yield from place(i + 1, new_broken)
+
+                if opened:
+                    used -= 1
+                if r and counts[c] == cap:
+                    full -= 1
+                deficit += gain
+                counts[c] -= 1
+                if monitor is not None and monitor.exhausted:
+                    return
+
+        yield from place(0, 0)
+
+    def _exhaustive_generation(self, teacher_kids: List[str], num_classes: int,
+                             friendships: FrozenSet[Tuple[str, str]],
+                             max_scenarios: int = 5,
+                             monitor: Optional[_SearchMonitor] = None) -> List[Tuple[Tuple[int, ...], int]]:
+        """
+        Εξαντλητική αναζήτηση branch-and-bound: κρατά heap με τα max_scenarios καλύτερα
+        σενάρια (λιγότερες σπασμένες φιλίες, μετά σειρά παραγωγής) και κλαδεύει κάθε
+        μερική ανάθεση που ήδη σπάει τουλάχιστον όσες φιλίες το χειρότερο κρατημένο.
+        Το αποτέλεσμα είναι ίδιο με την πλήρη απαρίθμηση + φιλτράρισμα, με σταθερή μνήμη.
+        Επιστρέφει ζεύγη (κωδικοί τμήματος ανά παιδί του teacher_kids, broken).
+        """
         print(f"Παραγωγή σεναρίων για {len(teacher_kids)} παιδιά σε {num_classes} τμήματα...")
-        
-        # Εξαντλητική παραγωγή
+
         total_combinations = num_classes ** len(teacher_kids)
-        print(f"Συνολικές περιπτώσεις: {total_combinations:,}")
-        
-        for assignment in itertools.product(class_labels_list, repeat=len(teacher_kids)):
-            assign_map = {teacher_kids[i]: assignment[i] for i in range(len(teacher_kids))}
-            
-            # ΕΛΕΓΧΟΣ 1: Ισοκατανομή ≤1
-            class_counts = {c: 0 for c in class_labels_list}
-            for name in teacher_kids:
-                class_counts[assign_map[name]] += 1
-            
-            counts_list = list(class_counts.values())
-            if max(counts_list) - min(counts_list) > 1:
-                continue  # Απόρριψη ανισοκατανομής >1
-            
-            # ΕΛΕΓΧΟΣ 2: Όχι όλα στο ίδιο τμήμα
-            unique_classes = set(assign_map.values())
-            if len(unique_classes) == 1:
-                continue  # Απόρριψη
-            
-            # ΕΛΕΓΧΟΣ 3: Canonical uniqueness
-            canon_key = self._canonical_key(teacher_kids, assign_map, class_labels_list)
-            if canon_key in seen_canonical:
+        print(f"Συνολικές περιπτώσεις: {total_combinations:,} (branch-and-bound, top-{max_scenarios})")
+
+        # Φιλίες ως δείκτες: για κάθε παιδί, οι φίλοι που τοποθετούνται πριν από αυτό
+        position = {name: i for i, name in enumerate(teacher_kids)}
+        earlier_friends: List[List[int]] = [[] for _ in teacher_kids]
+        for friend1, friend2 in friendships:
+            if friend1 not in position or friend2 not in position:
                 continue
-            seen_canonical.add(canon_key)
-            
-            # Υπολογισμός σπασμένων φιλιών
-            broken_friendships = self._count_broken_friendships(teacher_kids, assign_map, friendships)
-            
-            valid_scenarios.append((assign_map, broken_friendships))
-        
-        print(f"Έγκυρα σενάρια: {len(valid_scenarios)}")
-        
-        # Φιλτράρισμα αν >5
-        if len(valid_scenarios) > 5:
-            print("Εφαρμογή φιλτραρίσματος...")
-            
-            # Προτεραιότητα σε σενάρια με λιγότερα σπασμένα φιλιά
-            min_broken = min(s[1] for s in valid_scenarios)
+            i, j = position[friend1], position[friend2]
+            if i != j:
+                earlier_friends[max(i, j)].append(min(i, j))
+
+        # Max-heap (μέσω αρνητικών) σε (broken, σειρά): στην κορυφή το χειρότερο κρατημένο
+        heap: List[Tuple[int, int, Tuple[int, ...]]] = []
+        stats: Dict[str, int] = {}
+
+        def cutoff() -> Optional[int]:
+            return -heap[0][0] if len(heap) >= max_scenarios else None
+
+        found = 0
+        min_dropped: Optional[int] = None  # λιγότερα σπασμένα ανάμεσα στα φύλλα που βγήκαν από το heap
+        for seq, (assignment, broken) in enumerate(
+                self._balanced_partitions(len(teacher_kids), num_classes,
+                                          earlier_friends, cutoff, stats, monitor=monitor)):
+            found += 1
+            item = (-broken, -seq, assignment)
+            if len(heap) < max_scenarios:
+                heapq.heappush(heap, item)
+            else:
+                dropped = -heapq.heappushpop(heap, item)[0]
+                if min_dropped is None or dropped < min_dropped:
+                    min_dropped = dropped
+
+        print(f"Κόμβοι αναζήτησης: {stats['nodes']:,}, κλαδέματα: {stats['pruned']:,}")
+
+        kept = sorted((-b, -s, a) for b, s, a in heap)
+        interrupted = monitor is not None and monitor.exhausted
+        # Κάθε κλαδεμένη μερική ανάθεση έχει έγκυρη (ισόρροπη) συμπλήρωση, άρα κλάδεμα
+        # σημαίνει ότι υπάρχουν > max_scenarios σενάρια, όπως και found > max_scenarios
+        if kept and (found > max_scenarios or stats["pruned"] or interrupted):
+            # Υπήρχαν περισσότερα έγκυρα σενάρια: προτεραιότητα σε λιγότερες σπασμένες φιλίες
+            min_broken = kept[0][0]
             if min_broken == 0:
-                scenarios_without_breaks = [s for s in valid_scenarios if s[1] == 0]
-                print(f"Βρέθηκαν {len(scenarios_without_breaks)} σενάρια χωρίς σπασμένες φιλίες")
-                valid_scenarios = scenarios_without_breaks
+                kept = [k for k in kept if k[0] == 0]
+                print(f"Βρέθηκαν {len(kept)} σενάρια χωρίς σπασμένες φιλίες")
             else:
                 print(f"Όλα σπάζουν φιλίες (min: {min_broken}) - ταξινόμηση")
-                valid_scenarios.sort(key=lambda x: x[1])
-            
-            # Τελική επιλογή 5 σεναρίων
-            if len(valid_scenarios) > 5:
-                valid_scenarios = valid_scenarios[:5]
-        
+        else:
+            # Λίγα σενάρια: κρατούνται όλα με τη σειρά παραγωγής
+            kept.sort(key=lambda k: k[1])
+
+        # Περικοπή μόνο αν χάθηκε υποψήφιο ισόβαθμο με το χειρότερο κρατημένο ή αν διακόπηκε η
+        # αναζήτηση. Τα φύλλα που βγήκαν από το heap και τα φράγματα κλαδέματος είναι ≥ αυτού·
+        # ένα κλάδεμα με φράγμα ίσο δεν σημαίνει ότι υπάρχει και ισόβαθμη συμπλήρωση, οπότε
+        # ελέγχεται ξανά με σταθερό όριο: υπάρχουν > len(kept) σενάρια με σπασμένες ≤ worst;
+        # Ο έλεγχος αφορά μόνο την ενημέρωση: τρέχει εκτός monitor (δεν αγγίζει budget/exhaustive)
+        # και παραλείπεται όταν έχει οριστεί budget.
+        truncated = interrupted
+        budgeted = monitor is not None and (monitor.budget.seconds is not None or monitor.budget.nodes is not None)
+        if kept and not interrupted:
+            worst = max(k[0] for k in kept)
+            truncated = min_dropped == worst
+            if not truncated and not budgeted and stats.get("min_pruned") == worst:
+                within = self._balanced_partitions(len(teacher_kids), num_classes, earlier_friends,
+                                                   lambda: worst + 1)
+                truncated = sum(1 for _ in itertools.islice(within, len(kept) + 1)) > len(kept)
+        self._report_truncation(truncated, interrupted)
+
+        valid_scenarios = [(assignment, broken) for broken, _seq, assignment in kept]
+
+        print(f"Τελική επιλογή: {len(valid_scenarios)} σενάρια")
+        return valid_scenarios
+
+
+    def _report_truncation(self, truncated: bool, interrupted: bool) -> None:
+        """Ενημέρωση όταν τα κρατημένα σενάρια δεν είναι όλα τα ισόβαθμα καλύτερα"""
+        if interrupted:
+            print("Περικοπή: η αναζήτηση διακόπηκε στο όριο - τα σενάρια είναι τα καλύτερα που βρέθηκαν")
+        elif truncated:
+            print("Περικοπή: υπάρχουν κι άλλα σενάρια ισόβαθμα με το χειρότερο που κρατήθηκε")
+
+    def _friendship_components(self, teacher_kids: List[str],
+                               friendships: FrozenSet[Tuple[str, str]]) -> List[List[int]]:
+        """
+        Συνεκτικές συνιστώσες του γράφου φιλιών (δείκτες στο teacher_kids, αύξουσα σειρά).
+        Τα παιδιά χωρίς φιλία είναι μονομελείς συνιστώσες.
+        """
+        position = {name: i for i, name in enumerate(teacher_kids)}
+        neighbours: List[List[int]] = [[] for _ in teacher_kids]
+        for friend1, friend2 in friendships:
+            if friend1 in position and friend2 in position:
+                i, j = position[friend1], position[friend2]
+                if i != j:
+                    neighbours[i].append(j)
+                    neighbours[j].append(i)
+
+        seen = [False] * len(teacher_kids)
+        components = []
+        for root in range(len(teacher_kids)):
+            if seen[root]:
+                continue
+            seen[root] = True
+            stack, members = [root], []
+            while stack:
+                u = stack.pop()
+                members.append(u)
+                for v in neighbours[u]:
+                    if not seen[v]:
+                        seen[v] = True
+                        stack.append(v)
+            components.append(sorted(members))
+        return components
+
+    def _component_placements(self, size: int, earlier_friends: List[List[int]], num_classes: int,
+                              opened: int, cap: int, keep: int,
+                              monitor: Optional[_SearchMonitor] = None) -> Dict[Tuple[int, ...], List[Tuple[int, Tuple[int, ...]]]]:
+        """
+        Όλες οι τοποθετήσεις μίας συνιστώσας όταν είναι ήδη ανοιγμένα `opened` τμήματα:
+        τα ανοιγμένα είναι ελεύθερα, τα νέα ανοίγουν με τη σειρά (restricted growth).
+        Ομαδοποίηση ανά διάνυσμα πληθών ανά τμήμα, με τις `keep` καλύτερες ανά διάνυσμα
+        (σπασμένες φιλίες μέσα στη συνιστώσα, μετά λεξικογραφικά).
+        Αν εξαντληθεί το budget, επιστρέφονται όσες τοποθετήσεις βρέθηκαν ως τότε.
+        """
+        by_counts: Dict[Tuple[int, ...], List[Tuple[int, Tuple[int, ...]]]] = {}
+        counts = [0] * num_classes
+        labels = [0] * size
+
+        def place(i: int, used: int, broken: int) -> None:
+            if i == size:
+                by_counts.setdefault(tuple(counts), []).append((broken, tuple(labels)))
+                return
+            for c in range(min(used + 1, num_classes)):
+                if counts[c] >= cap:
+                    continue
+                if monitor is not None and not monitor.tick():
+                    return
+                new_broken = broken
+                for j in earlier_friends[i]:
+                    if labels[j] != c:
+                        new_broken += 1
+                counts[c] += 1
+                labels[i] = c
+                place(i + 1, used + 1 if c == used else used, new_broken)
+                counts[c] -= 1
+
+        place(0, opened, 0)
+        for vec, options in by_counts.items():
+            options.sort()
+            del options[keep:]
+        return by_counts
+
+    def _component_generation(self, teacher_kids: List[str], num_classes: int,
+                              friendships: FrozenSet[Tuple[str, str]],
+                              components: Optional[List[List[int]]] = None,
+                              max_scenarios: int = 5,
+                              monitor: Optional[_SearchMonitor] = None) -> List[Tuple[Tuple[int, ...], int]]:
+        """
+        Αποσύνθεση ανά συνιστώσα φιλιών: οι σπασμένες φιλίες είναι άθροισμα ανά συνιστώσα,
+        οπότε κάθε συνιστώσα απαριθμείται χωριστά και οι τοποθετήσεις συνδυάζονται με DP
+        πάνω στο διάνυσμα πληθών ανά τμήμα (κρατώντας τις καλύτερες ανά κατάσταση).
+        Τα παιδιά χωρίς φιλίες συμπληρώνουν στο τέλος την ισοκατανομή.
+
+        Τα κριτήρια επιλογής είναι τα ίδια με το _exhaustive_generation. Σε ισοβαθμίες,
+        η σειρά ορίζεται από τα παιδιά ταξινομημένα ανά συνιστώσα.
+        """
+        n = len(teacher_kids)
+        if components is None:
+            components = self._friendship_components(teacher_kids, friendships)
+        groups = [comp for comp in components if len(comp) > 1]
+        isolated = [comp[0] for comp in components if len(comp) == 1]
+        order = [i for comp in groups for i in comp] + isolated
+        keep = max_scenarios + 1  # +1: για να ξέρουμε αν υπάρχουν > max_scenarios σενάρια
+
+        print(f"Αποσύνθεση σε {len(groups)} συνιστώσες φιλιών + {len(isolated)} παιδιά χωρίς φιλίες")
+
+        q, r = divmod(n, num_classes)
+        cap = q + (1 if r else 0)
+
+        def feasible(counts: Tuple[int, ...], remaining: int) -> bool:
+            if max(counts) > cap:
+                return False
+            if r and sum(1 for c in counts if c == cap) > r:
+                return False
+            return sum(max(0, q - c) for c in counts) <= remaining
+
+        position = {name: i for i, name in enumerate(teacher_kids)}
+        pairs = [(position[a], position[b]) for a, b in friendships if a in position and b in position]
+
+        # DP: διάνυσμα πληθών -> οι καλύτερες (broken, ετικέτες με τη σειρά `order`)
+        states: Dict[Tuple[int, ...], List[Tuple[int, Tuple[int, ...]]]] = {(0,) * num_classes: [(0, ())]}
+        placed = 0
+        for comp in groups:
+            local = {kid: i for i, kid in enumerate(comp)}
+            earlier_friends: List[List[int]] = [[] for _ in comp]
+            for i, j in pairs:
+                if i in local and j in local:
+                    a, b = sorted((local[i], local[j]))
+                    earlier_friends[b].append(a)
+
+            placements_by_opened: Dict[int, Dict] = {}
+            placed += len(comp)
+            new_states: Dict[Tuple[int, ...], List[Tuple[int, Tuple[int, ...]]]] = {}
+            for counts, entries in states.items():
+                opened = sum(1 for c in counts if c)
+                if opened not in placements_by_opened:
+                    placements_by_opened[opened] = self._component_placements(
+                        len(comp), earlier_friends, num_classes, opened, cap, keep, monitor)
+                for delta, options in placements_by_opened[opened].items():
+                    merged_counts = tuple(a + b for a, b in zip(counts, delta))
+                    if not feasible(merged_counts, n - placed):
+                        continue
+                    bucket = new_states.setdefault(merged_counts, [])
+                    for broken1, labels1 in entries:
+                        for broken2, labels2 in options:
+                            bucket.append((broken1 + broken2, labels1 + labels2))
+            for bucket in new_states.values():
+                bucket.sort()
+                del bucket[keep:]
+            states = new_states
+
+        # Συμπλήρωση με τα παιδιά χωρίς φιλίες (δεν αλλάζουν τις σπασμένες φιλίες)
+        candidates = []
+        for counts, entries in states.items():
+            fills = list(itertools.islice(
+                self._balanced_partitions(len(isolated), num_classes, start_counts=list(counts)), keep))
+            for broken, labels in entries:
+                for fill, _ in fills:
+                    candidates.append((broken, labels + fill))
+        candidates = heapq.nsmallest(keep, candidates)
+
+        # Επαναφορά στη σειρά του teacher_kids, με ονομασία τμημάτων κατά πρώτη εμφάνιση
+        kept = []
+        for broken, labels in candidates:
+            by_kid = [0] * n
+            for kid, label in zip(order, labels):
+                by_kid[kid] = label
+            relabel: Dict[int, int] = {}
+            canonical = tuple(relabel.setdefault(label, len(relabel)) for label in by_kid)
+            kept.append((broken, canonical))
+        kept.sort()
+
+        interrupted = monitor is not None and monitor.exhausted
+        truncated = interrupted
+        if kept and (len(kept) > max_scenarios or interrupted):
+            # kept[max_scenarios] (αν υπάρχει) είναι το καλύτερο υποψήφιο που μένει εκτός
+            first_dropped = kept[max_scenarios][0] if len(kept) > max_scenarios else None
+            kept = kept[:max_scenarios]
+            min_broken = kept[0][0]
+            if min_broken == 0:
+                kept = [k for k in kept if k[0] == 0]
+                print(f"Βρέθηκαν {len(kept)} σενάρια χωρίς σπασμένες φιλίες")
+            else:
+                print(f"Όλα σπάζουν φιλίες (min: {min_broken}) - ταξινόμηση")
+            truncated = interrupted or first_dropped == kept[-1][0]
+        else:
+            kept.sort(key=lambda k: k[1])
+        self._report_truncation(truncated, interrupted)
+
+        valid_scenarios = [(assignment, broken) for broken, assignment in kept]
+
         print(f"Τελική επιλογή: {len(valid_scenarios)} σενάρια")
         return valid_scenarios
 
 
 # === UTILITY FUNCTIONS ===
 
-def create_immutable_step1(df: pd.DataFrame, num_classes: Optional[int] = None) -> Tuple[pd.DataFrame, Step1Results]:
+_YES_TOKENS = ["Ν", "ΝΑΙ", "YES", "TRUE", "1", "Y"]
+
+
+def friendship_adjacency(df: pd.DataFrame, friendship_cols: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matrix-style φιλίες (μία στήλη ανά μαθητή) -> boolean πίνακας γειτνίασης σε ένα πέρασμα.
+
+    Returns:
+        (names, A): names τα μοναδικά ονόματα (σειρά πρώτης εμφάνισης) και A[i, j] = True
+        αν ο names[i] έγραψε τον names[j] ως φίλο (Ν/ΝΑΙ/YES/...). Η διαγώνιος είναι False.
+    """
+    row_codes, unique_names = pd.factorize(df["ΟΝΟΜΑ"].astype(str).str.strip())
+    names = np.asarray(unique_names, dtype=object)
+    n = len(names)
+
+    # Κανονικοποίηση Ν/Ο για όλο το μπλοκ μαζί (ίδιοι κανόνες με το _norm_yesno)
+    block = df[friendship_cols].to_numpy(dtype=object).astype(str)
+    said_yes = np.isin(np.char.upper(np.char.strip(block)), _YES_TOKENS)
+
+    # Γραμμές με ίδιο όνομα συγχωνεύονται (OR)
+    by_name = np.zeros((n, len(friendship_cols)), dtype=bool)
+    np.logical_or.at(by_name, row_codes, said_yes)
+
+    col_codes = unique_names.get_indexer([str(c).strip() for c in friendship_cols])
+    valid = col_codes >= 0
+    adjacency = np.zeros((n, n), dtype=bool)
+    np.logical_or.at(adjacency.T, col_codes[valid], by_name[:, valid].T)
+    np.fill_diagonal(adjacency, False)
+    return names, adjacency
+
+
+def mutual_friendship_edges(adjacency: np.ndarray) -> np.ndarray:
+    """Αμοιβαίες φιλίες (A & A.T) ως πίνακας ακμών E×2 με i < j, σε λεξικογραφική σειρά"""
+    mutual = np.triu(adjacency & adjacency.T, k=1)
+    return np.argwhere(mutual)
+
+
+def _first_row_positions(names: pd.Series) -> Dict[str, int]:
+    """Ευρετήριο όνομα -> θέση της ΠΡΩΤΗΣ γραμμής με αυτό το όνομα"""
+    first = ~names.duplicated(keep="first").to_numpy()
+    return dict(zip(names.to_numpy()[first].tolist(), np.flatnonzero(first).tolist()))
+
+
+def create_immutable_step1(df: pd.DataFrame, num_classes: Optional[int] = None,
+                           compact: bool = False,
+                           cache: Optional[Step1ResultsCache] = None,
+                           budget: Union[Step1Budget, float, None] = None,
+                           progress: Optional[Callable[[int, float], None]] = None,
+                           categorical: bool = False) -> Tuple[pd.DataFrame, Step1Results]:
     """
     Δημιουργεί immutable αποτελέσματα βήματος 1.
     
     Args:
         df: Αρχικό DataFrame με δεδομένα μαθητών
         num_classes: Αριθμός τμημάτων (αν None, αυτόματος υπολογισμός)
+        compact: Σενάρια CompactStep1Scenario (κωδικοί int8) στα αποτελέσματα
+        cache: Step1ResultsCache για επαναχρησιμοποίηση σεναρίων του ίδιου καταλόγου
+        budget: Όριο αναζήτησης (Step1Budget ή δευτερόλεπτα)· δες results.exhaustive
+        progress: callback(κόμβοι, δευτερόλεπτα) κατά την απαρίθμηση
+        categorical: Στήλες ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X ως Categorical αντί για κείμενο
     
     Returns:
         (DataFrame με στήλες ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X, Step1Results object)
     """
     processor = Step1ImmutableProcessor()
-    results = processor.create_scenarios(df, num_classes)
-    updated_df = processor.apply_to_dataframe(df)
+    results = processor.create_scenarios(df, num_classes, cache=cache, budget=budget, progress=progress,
+                                         compact=compact)
+    updated_df = processor.apply_to_dataframe(df, categorical=categorical)
     
     return updated_df, results
 
@@ -530,16 +1313,68 @@ if __name__ == "__main__":
 # ===============================
 import re as __re_exact
 import pandas as __pd_exact
+from datetime import datetime as __datetime_exact
 from pandas import ExcelWriter as __ExcelWriter_exact
 
 def __scenario_index_exact(colname: str) -> int:
     m = __re_exact.search(r'(\d+)$', str(colname))
     return int(m.group(1)) if m else 9999
 
-def export_exact_multisheet(df_with_step1: __pd_exact.DataFrame, output_file: str) -> None:
+def __excel_cell_exact(value):
+    """Τιμή κελιού όπως τη γράφει το pandas: None για κενό (NaN/None/NaT/pd.NA), Python scalars"""
+    if value is None or (__pd_exact.api.types.is_scalar(value) and __pd_exact.isna(value)):
+        return None
+    if isinstance(value, __pd_exact.Timestamp):
+        return None if __pd_exact.isna(value) else value.to_pydatetime()
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        value = value.item()  # numpy scalar -> Python
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value in (float("inf"), float("-inf")):
+            return "inf" if value > 0 else "-inf"
+    return value
+
+def __export_streaming_exact(df_with_step1: __pd_exact.DataFrame, output_file: str,
+                             base_cols: list, scenario_cols: list) -> None:
+    """
+    Εγγραφή με xlsxwriter σε constant_memory: κάθε φύλλο γράφεται γραμμή-γραμμή
+    απευθείας από τους πίνακες των στηλών (χωρίς αντίγραφα του DataFrame).
+    """
+    import xlsxwriter
+    base_values = [df_with_step1[c].to_numpy() for c in base_cols]
+    n_rows = len(df_with_step1)
+    with xlsxwriter.Workbook(output_file, {"constant_memory": True}) as wb:
+        header_fmt = wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        datetime_fmt = wb.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        for col in scenario_cols:
+            ws = wb.add_worksheet(str(col)[:31])
+            columns = base_values + [df_with_step1[col].to_numpy()]
+            for j, name in enumerate(base_cols + [col]):
+                ws.write(0, j, str(name), header_fmt)
+            for i in range(n_rows):
+                for j, values in enumerate(columns):
+                    value = __excel_cell_exact(values[i])
+                    if value is None:
+                        ws.write_blank(i + 1, j, None)
+                        continue
+                    if isinstance(value, __datetime_exact):
+                        ws.write_datetime(i + 1, j, value, datetime_fmt)
+                    else:
+                        ws.write(i + 1, j, value)
+
+def export_exact_multisheet(df_with_step1: __pd_exact.DataFrame, output_file: str,
+                            streaming: bool = False) -> None:
+    """
+    Ένα φύλλο ανά ΒΗΜΑ1_ΣΕΝΑΡΙΟ_k με τις βασικές στήλες + τη στήλη του σεναρίου.
+    streaming=False (default): openpyxl μέσω pandas· True: xlsxwriter constant_memory (σταθερή μνήμη).
+    """
     scenario_cols = [c for c in df_with_step1.columns if str(c).startswith("ΒΗΜΑ1_ΣΕΝΑΡΙΟ_")]
     scenario_cols = sorted(scenario_cols, key=__scenario_index_exact)
     base_cols = [c for c in df_with_step1.columns if c not in scenario_cols]
+    if streaming:
+        __export_streaming_exact(df_with_step1, output_file, base_cols, scenario_cols)
+        return
     with __ExcelWriter_exact(output_file, engine="openpyxl") as writer:
         for col in scenario_cols:
             df_out = df_with_step1[base_cols + [col]].copy()
@@ -563,6 +1398,9 @@ if __name__ == "__main__":
     parser.add_argument("--sheet", "-s", default=None, help="(optional) Sheet name")
     parser.add_argument("--num-classes", "-n", type=int, default=None, help="Force number of classes (optional)")
     parser.add_argument("--output", "-o", default="STEP1_IMMUTABLE_MULTISHEET_NODUP.xlsx", help="Output filename")
+    parser.add_argument("--cache-dir", default=None, help="(optional) Directory for the Step 1 results cache")
+    parser.add_argument("--budget", type=float, default=None, help="(optional) Time budget in seconds for the Rule 2 search")
+    parser.add_argument("--streaming", action="store_true", help="(optional) Constant-memory export via xlsxwriter")
     args = parser.parse_args()
 
     import pandas as _pd
@@ -576,11 +1414,13 @@ if __name__ == "__main__":
     df0 = xl.parse(sheet_name)
 
     try:
-        df_with_step1, results_obj = create_immutable_step1(df0, num_classes=args.num_classes)
+        cache = Step1ResultsCache(args.cache_dir) if args.cache_dir else None
+        df_with_step1, results_obj = create_immutable_step1(df0, num_classes=args.num_classes, cache=cache,
+                                                           budget=args.budget)
     except Exception as e:
         print("❌ Σφάλμα στο create_immutable_step1:", e)
         sys.exit(1)
 
-    export_exact_multisheet(df_with_step1, args.output)
+    export_exact_multisheet(df_with_step1, args.output, streaming=args.streaming)
     print(f"✅ OK: {args.output}")
 
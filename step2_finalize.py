@@ -9,6 +9,7 @@
     ένα φύλλο ανά σενάριο.
 """
 from typing import Optional, Tuple, List, Dict
+import numpy as np
 import pandas as pd
 import re, math
 
@@ -40,12 +41,17 @@ def finalize_step2_assignments(
         num_classes = max(2, math.ceil(len(result_df) / 25))
         available_classes = [f"Α{i+1}" for i in range(num_classes)]
         placed_classes = pd.Series([0] * len(available_classes), index=available_classes)
-    unplaced_names = result_df[unplaced_mask]["ΟΝΟΜΑ"].tolist()
     classes_by_size = placed_classes.sort_values().index.tolist()
-    for i, student_name in enumerate(unplaced_names):
-        target_class = classes_by_size[i % len(classes_by_size)]
-        student_idx = result_df[result_df["ΟΝΟΜΑ"] == student_name].index[0]
-        result_df.loc[student_idx, final_col_name] = target_class
+    # Round-robin σε ένα πέρασμα: κάθε ατοποθέτητος γράφεται στην ΠΡΩΤΗ γραμμή με το όνομά του
+    # (οι κωδικοί του factorize ακολουθούν τη σειρά πρώτης εμφάνισης: 0..U-1)
+    codes, _ = pd.factorize(result_df["ΟΝΟΜΑ"], use_na_sentinel=False)
+    _, first_row = np.unique(codes, return_index=True)
+    unplaced_pos = np.flatnonzero(unplaced_mask.to_numpy())
+    labels = np.array(classes_by_size, dtype=object)
+    targets = labels[np.arange(len(unplaced_pos)) % len(labels)]
+    values = result_df[final_col_name].to_numpy(dtype=object, copy=True)
+    values[first_row[codes[unplaced_pos]]] = targets
+    result_df[final_col_name] = values
     final_distribution = result_df[final_col_name].value_counts().to_dict()
     stats = {
         "total_students": len(result_df),
@@ -88,6 +94,84 @@ def lock_step2_results(df: pd.DataFrame, step2_column: str) -> pd.DataFrame:
     return final_df
 
 # ------------------ Exporters ------------------
+def _load_step1_workbook(step1_workbook_path: str, sid_of) -> Tuple[List[pd.DataFrame], List[tuple]]:
+    """
+    Διαβάζει το workbook του Βήματος 1 ΜΙΑ φορά και κανονικοποιεί ΜΙΑ φορά.
+    Επιστρέφει (frames, scenarios):
+      frames:    κανονικοποιημένα πλαίσια βάσης (χωρίς στήλες ΒΗΜΑ1)· φύλλα με ίδια βάση
+                 (η συνήθης μορφή: ένα φύλλο ανά σενάριο) μοιράζονται το ίδιο πλαίσιο
+      scenarios: (sid, step1_col, αρχικό φύλλο, δείκτης στο frames, τιμές της στήλης ως array)
+                 με τη σειρά φύλλων/στηλών· διπλά sid αγνοούνται
+    """
+    from step_2_helpers_FIXED import normalize_columns, find_step1_scenario_columns
+
+    sheets = pd.read_excel(step1_workbook_path, sheet_name=None)
+    frames: List[pd.DataFrame] = []
+    bases: List[pd.DataFrame] = []
+    scenarios: List[tuple] = []
+    seen_ids = set()
+    for orig_df in sheets.values():
+        step1_cols = find_step1_scenario_columns(orig_df)
+        new_cols = []
+        for step1_col in step1_cols:
+            sid = sid_of(step1_col)
+            if sid not in seen_ids:
+                seen_ids.add(sid)
+                new_cols.append((sid, step1_col))
+        if not new_cols:
+            continue
+        base = orig_df.drop(columns=step1_cols)
+        frame_idx = next((i for i, b in enumerate(bases) if b.columns.equals(base.columns) and b.equals(base)), None)
+        if frame_idx is None:
+            frame_idx = len(frames)
+            bases.append(base)
+            frames.append(normalize_columns(base))
+        for sid, step1_col in new_cols:
+            scenarios.append((sid, step1_col, orig_df, frame_idx, orig_df[step1_col].to_numpy()))
+    return frames, scenarios
+
+# Πλαίσια βάσης (και ευρετήρια φιλιών τους) κάθε διεργασίας του pool: στέλνονται μία φορά
+# μέσω initializer, όχι ανά σενάριο
+_WORKER_FRAMES: List[pd.DataFrame] = []
+_WORKER_FRIENDS: list = []
+
+def _init_step2_worker(frames: List[pd.DataFrame], friends: list) -> None:
+    global _WORKER_FRAMES, _WORKER_FRIENDS
+    _WORKER_FRAMES = frames
+    _WORKER_FRIENDS = friends
+
+def _step2_job(job, frames: Optional[List[pd.DataFrame]] = None, friends: Optional[list] = None):
+    """Ένα σενάριο Βήματος 2 (top-level ώστε να εκτελείται και σε διεργασία του pool)."""
+    from step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED import step2_apply_FIXED_v3
+    frame_idx, step1_col, values, seed, max_results, time_budget, node_budget = job
+    if frames is None:
+        frames, friends = _WORKER_FRAMES, _WORKER_FRIENDS
+    df = frames[frame_idx].copy(deep=False)
+    df[step1_col] = values
+    return step2_apply_FIXED_v3(df, step1_col, seed=seed, max_results=max_results, normalized=True,
+                                time_budget=time_budget, node_budget=node_budget,
+                                friends=friends[frame_idx] if friends else None)
+
+def _scenario_seed(seed: int, sid: int) -> int:
+    """Σταθερό seed ανά σενάριο: ανεξάρτητο από τη σειρά/διεργασία που το εκτελεί."""
+    return seed + sid
+
+def _run_step2_jobs(jobs: List[tuple], frames: List[pd.DataFrame], workers: Optional[int] = None) -> List[list]:
+    """
+    Εκτελεί τα σενάρια (ανεξάρτητα μεταξύ τους) σειριακά ή, με workers > 1, σε ProcessPoolExecutor.
+    Τα αποτελέσματα επιστρέφουν με τη σειρά των jobs· κάθε σενάριο παίρνει το δικό του seed
+    μέσα στο job (_scenario_seed), άρα η έξοδος είναι ίδια με τη σειριακή εκτέλεση.
+    Το FriendshipIndex χτίζεται μία φορά ανά πλαίσιο βάσης και μοιράζεται στα σενάριά του.
+    """
+    from step_2_helpers_FIXED import FriendshipIndex
+    friends = [FriendshipIndex(frame) for frame in frames]
+    if not workers or workers <= 1 or len(jobs) <= 1:
+        return [_step2_job(job, frames, friends) for job in jobs]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                             initializer=_init_step2_worker, initargs=(frames, friends)) as pool:
+        return list(pool.map(_step2_job, jobs))
+
 def export_step2_minimal_nextcol(
     step1_workbook_path: str,
     out_xlsx_path: str,
@@ -95,49 +179,44 @@ def export_step2_minimal_nextcol(
     seed: int = 42,
     max_results: int = 5,
     core_columns: Optional[List[str]] = None,
-    sheet_naming: str = "ΣΕΝΑΡΙΟ_{id}"
+    sheet_naming: str = "ΣΕΝΑΡΙΟ_{id}",
+    workers: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    node_budget: Optional[int] = None
 ) -> None:
-    """Παλιός ελαφρύς exporter: κρατά βασικές στήλες + ΒΗΜΑ1/ΒΗΜΑ2."""
-    from step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED import step2_apply_FIXED_v3
-    from step_2_helpers_FIXED import (
-        normalize_columns, extract_step1_id, find_step1_scenario_columns, pick_core_columns
-    )
+    """
+    Παλιός ελαφρύς exporter: κρατά βασικές στήλες + ΒΗΜΑ1/ΒΗΜΑ2.
+    workers > 1: τα σενάρια εκτελούνται παράλληλα σε διεργασίες (ίδια έξοδος).
+    time_budget / node_budget: όριο της αναζήτησης του Βήματος 2 ανά σενάριο (βλ. step2_apply_FIXED_v3).
+    """
+    from step_2_helpers_FIXED import extract_step1_id, pick_core_columns
 
-    xls = pd.ExcelFile(step1_workbook_path)
-    seen_ids = set()
     outputs: Dict[int, Dict] = {}
+    frames, scenarios = _load_step1_workbook(step1_workbook_path, extract_step1_id)
+    jobs = [(frame_idx, step1_col, values, _scenario_seed(seed, sid), max_results, time_budget, node_budget)
+            for sid, step1_col, _, frame_idx, values in scenarios]
 
-    for sh in xls.sheet_names:
-        df_raw = xls.parse(sh)
-        df = normalize_columns(df_raw)
-        step1_cols = find_step1_scenario_columns(df)
-        for step1_col in step1_cols:
-            sid = extract_step1_id(step1_col)
-            if sid in seen_ids:
-                continue
-            seen_ids.add(sid)
-
-            options = step2_apply_FIXED_v3(df, step1_col, seed=seed, max_results=max_results)
-            def key_fn(opt):
-                label, opt_df, m = opt
-                pen = m.get("penalty") if m.get("penalty") is not None else 10**9
-                bro = m.get("broken") if m.get("broken") is not None else 10**9
-                ped = m.get("ped_conflicts") if m.get("ped_conflicts") is not None else 10**9
-                return (pen, bro, ped)
-            best_label, best_df, best_metrics = sorted(options, key=key_fn)[0]
-
-            step2_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
-            if step2_col not in best_df.columns:
-                cands = [c for c in best_df.columns if str(c).startswith("ΒΗΜΑ2_")]
-                if not cands:
-                    raise RuntimeError(f"Δεν βρέθηκε στήλη ΒΗΜΑ2 για το σενάριο {sid}.")
-                step2_col = cands[0]
-
-            keep_core = pick_core_columns(best_df, core_columns)
-            cols = keep_core + [step1_col, step2_col]
-            minimal_df = best_df[cols].copy()
-
-            outputs[sid] = {"sheet_name": sheet_naming.format(id=sid), "df": minimal_df}
+    for (sid, step1_col, _, _, _), options in zip(scenarios, _run_step2_jobs(jobs, frames, workers)):
+        def key_fn(opt):
+            label, opt_df, m = opt
+            pen = m.get("penalty") if m.get("penalty") is not None else 10**9
+            bro = m.get("broken") if m.get("broken") is not None else 10**9
+            ped = m.get("ped_conflicts") if m.get("ped_conflicts") is not None else 10**9
+            return (pen, bro, ped)
+        best_label, best_df, best_metrics = sorted(options, key=key_fn)[0]
+
+        step2_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
+        if step2_col not in best_df.columns:
+            cands = [c for c in best_df.columns if str(c).startswith("ΒΗΜΑ2_")]
+            if not cands:
+                raise RuntimeError(f"Δεν βρέθηκε στήλη ΒΗΜΑ2 για το σενάριο {sid}.")
+            step2_col = cands[0]
+
+        keep_core = pick_core_columns(best_df, core_columns)
+        cols = keep_core + [step1_col, step2_col]
+        minimal_df = best_df[cols].copy()
+
+        outputs[sid] = {"sheet_name": sheet_naming.format(id=sid), "df": minimal_df}
 
     with pd.ExcelWriter(out_xlsx_path, engine="xlsxwriter") as writer:
         for sid in sorted(outputs.keys()):
@@ -149,7 +228,10 @@ def export_step2_nextcol_full(
     *,
     seed: int = 42,
     max_results: int = 5,
-    sheet_naming: str = "ΣΕΝΑΡΙΟ_{id}"
+    sheet_naming: str = "ΣΕΝΑΡΙΟ_{id}",
+    workers: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    node_budget: Optional[int] = None
 ) -> None:
     """
     ΝΕΟΣ DEFAULT EXPORTER — FULL:
@@ -157,59 +239,49 @@ def export_step2_nextcol_full(
     - Εκτελεί Βήμα 2 ανά σενάριο και προσθέτει τη «ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{N}»
       αμέσως δεξιά από τη «ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{N}». Ένα sheet ανά σενάριο.
     - Δεν γράφει καμία FINAL/audit στήλη.
+    - workers > 1: τα σενάρια εκτελούνται παράλληλα σε διεργασίες (ίδια έξοδος, ίδια σειρά).
+    - time_budget / node_budget: όριο της αναζήτησης του Βήματος 2 ανά σενάριο (βλ. step2_apply_FIXED_v3).
     """
-    from step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED import step2_apply_FIXED_v3
-
-    xls = pd.ExcelFile(step1_workbook_path)
-    used_ids = set()
     outputs: Dict[int, Dict] = {}
 
     def _sid_from_col(col_name: str) -> int:
         m = re.search(r'ΣΕΝΑΡΙΟ[_\s]*(\d+)', str(col_name).upper())
         return int(m.group(1)) if m else 1
 
-    def _find_step1_cols(df: pd.DataFrame):
-        return [c for c in df.columns if str(c).strip().upper().startswith("ΒΗΜΑ1_ΣΕΝΑΡΙΟ_")]
+    frames, scenarios = _load_step1_workbook(step1_workbook_path, _sid_from_col)
+    jobs = [(frame_idx, step1_col, values, _scenario_seed(seed, sid), max_results, time_budget, node_budget)
+            for sid, step1_col, _, frame_idx, values in scenarios]
 
-    for sh in xls.sheet_names:
-        orig_df = xls.parse(sh)
-        step1_cols = _find_step1_cols(orig_df)
-        for step1_col in step1_cols:
-            sid = _sid_from_col(step1_col)
-            if sid in used_ids:
-                continue
-            used_ids.add(sid)
-
-            options = step2_apply_FIXED_v3(orig_df.copy(), step1_col, seed=seed, max_results=max_results)
-            def key_fn(opt):
-                label, opt_df, m = opt
-                pen = m.get("penalty") if m.get("penalty") is not None else 10**9
-                bro = m.get("broken") if m.get("broken") is not None else 10**9
-                ped = m.get("ped_conflicts") if m.get("ped_conflicts") is not None else 10**9
-                return (pen, bro, ped)
-            best_label, best_df, best_metrics = sorted(options, key=key_fn)[0]
-
-            step2_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
-            if step2_col not in best_df.columns:
-                cands = [c for c in best_df.columns if str(c).startswith("ΒΗΜΑ2_")]
-                if not cands:
-                    raise RuntimeError(f"Δεν βρέθηκε στήλη ΒΗΜΑ2 στο αποτέλεσμα για σενάριο {sid}.")
-                step2_col = cands[0]
-
-            if "ΟΝΟΜΑ" not in orig_df.columns:
-                raise RuntimeError("Το αρχικό φύλλο δεν έχει στήλη 'ΟΝΟΜΑ'.")
-            s_step2 = best_df.set_index("ΟΝΟΜΑ")[step2_col]
-            merged = orig_df.copy()
-            merged[step2_col] = merged["ΟΝΟΜΑ"].map(s_step2.to_dict())
-
-            cols = merged.columns.tolist()
-            if step2_col in cols:
-                cols.remove(step2_col)
-            idx = cols.index(step1_col) + 1 if step1_col in cols else len(cols)
-            cols = cols[:idx] + [step2_col] + cols[idx:]
-            merged = merged[cols]
-
-            outputs[sid] = {"sheet_name": sheet_naming.format(id=sid), "df": merged}
+    for (sid, step1_col, orig_df, _, _), options in zip(scenarios, _run_step2_jobs(jobs, frames, workers)):
+        def key_fn(opt):
+            label, opt_df, m = opt
+            pen = m.get("penalty") if m.get("penalty") is not None else 10**9
+            bro = m.get("broken") if m.get("broken") is not None else 10**9
+            ped = m.get("ped_conflicts") if m.get("ped_conflicts") is not None else 10**9
+            return (pen, bro, ped)
+        best_label, best_df, best_metrics = sorted(options, key=key_fn)[0]
+
+        step2_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
+        if step2_col not in best_df.columns:
+            cands = [c for c in best_df.columns if str(c).startswith("ΒΗΜΑ2_")]
+            if not cands:
+                raise RuntimeError(f"Δεν βρέθηκε στήλη ΒΗΜΑ2 στο αποτέλεσμα για σενάριο {sid}.")
+            step2_col = cands[0]
+
+        if "ΟΝΟΜΑ" not in orig_df.columns:
+            raise RuntimeError("Το αρχικό φύλλο δεν έχει στήλη 'ΟΝΟΜΑ'.")
+        s_step2 = best_df.set_index("ΟΝΟΜΑ")[step2_col]
+        merged = orig_df.copy()
+        merged[step2_col] = merged["ΟΝΟΜΑ"].map(s_step2.to_dict())
+
+        cols = merged.columns.tolist()
+        if step2_col in cols:
+            cols.remove(step2_col)
+        idx = cols.index(step1_col) + 1 if step1_col in cols else len(cols)
+        cols = cols[:idx] + [step2_col] + cols[idx:]
+        merged = merged[cols]
+
+        outputs[sid] = {"sheet_name": sheet_naming.format(id=sid), "df": merged}
 
     with pd.ExcelWriter(out_xlsx_path, engine="xlsxwriter") as writer:
         for sid in sorted(outputs.keys()):
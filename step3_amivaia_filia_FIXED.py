@@ -6,14 +6,17 @@ step3_amivaia_filia_FIXED.py
   όπου ο 1 είναι ήδη τοποθετημένος (στο Βήμα 2) και ο 2 είναι ατοποθέτητος.
 - Δεν «σπάει» καμία δυάδα: αν δεν χωράει λόγω ορίου 25, η δυάδα μετρά ως broken και ο ατοποθέτητος παραμένει κενός.
 - Υπολογίζει broken δυάδες & penalty, επιλέγει έως 5 καλύτερα σενάρια.
+- mode="greedy" (default): δυάδες με σειρά (λιγότερες επιλογές, τμήμα).
+  mode="flow": min-cost max-flow για τις δυάδες προς ήδη τοποθετημένους φίλους (υπό το όριο 25)·
+  κρατείται η λύση του greedy αν σπάει λιγότερες δυάδες συνολικά.
 """
+from collections import Counter, defaultdict, deque
 from typing import List, Tuple, Dict, Optional
 import pandas as pd
 import re
 from pathlib import Path
 from step_3_helpers_FIXED import (
-    parse_friends_string, are_mutual_pair, mutual_dyads,
-    count_broken_dyads, calculate_penalty_score_step3, select_best_scenarios
+    FriendshipIndex, count_broken_dyads, calculate_penalty_score_step3, select_best_scenarios
 )
 
 def _auto_num_classes(df, override=None):
@@ -23,19 +26,110 @@ def _auto_num_classes(df, override=None):
     k = max(2, math.ceil(n/25))
     return int(k if override is None else override)
 
-def _class_fits(df: pd.DataFrame, col: str, class_name: str, add: int=1) -> bool:
-    return (df[col]==class_name).sum() + add <= 25
+def _class_fits(occupancy: Counter, class_name: str, add: int=1) -> bool:
+    """occupancy: πλήθος μαθητών ανά τμήμα (ενημερώνεται σε κάθε τοποθέτηση)."""
+    return occupancy[class_name] + add <= 25
+
+def _max_weight_placement(weights: Dict[str, Dict[str, int]], capacity: Dict[str, int]) -> Dict[str, str]:
+    """
+    Ανάθεση μαθητή -> τμήμα που μεγιστοποιεί το άθροισμα weights[u][c] (διατηρημένες δυάδες)
+    χωρίς να ξεπερνά τις ελεύθερες θέσεις capacity[c].
+    Δίκτυο: πηγή -> u (χωρητ. 1) -> c (κόστος -weights[u][c]) -> καταβόθρα (capacity[c]).
+    Min-cost flow με διαδοχικές συντομότερες διαδρομές (Bellman–Ford, λόγω αρνητικών κοστών)·
+    σταματά όταν καμία επαυξάνουσα διαδρομή δεν έχει αρνητικό κόστος. Πολυωνυμικό, χωρίς solver.
+    """
+    students = list(weights)
+    classes = sorted({c for w in weights.values() for c in w}, key=str)
+    source, sink = 0, 1
+    node_u = {u: 2 + i for i, u in enumerate(students)}
+    node_c = {c: 2 + len(students) + j for j, c in enumerate(classes)}
+    n_nodes = 2 + len(students) + len(classes)
+
+    # Ακμές σε ζεύγη (e, e ^ 1 = αντίστροφη)
+    to: List[int] = []; cap: List[int] = []; cost: List[int] = []
+    adj: List[List[int]] = [[] for _ in range(n_nodes)]
+    def add_edge(a: int, b: int, c: int, w: int) -> int:
+        for x, y, cc, ww in ((a, b, c, w), (b, a, 0, -w)):
+            adj[x].append(len(to)); to.append(y); cap.append(cc); cost.append(ww)
+        return len(to) - 2
+
+    assign_edges = []
+    for u in students:
+        add_edge(source, node_u[u], 1, 0)
+        for c in classes:
+            if weights[u].get(c, 0) > 0:
+                assign_edges.append((u, c, add_edge(node_u[u], node_c[c], 1, -weights[u][c])))
+    for c in classes:
+        if capacity.get(c, 0) > 0:
+            add_edge(node_c[c], sink, capacity[c], 0)
+
+    while True:
+        # Bellman–Ford (ουρά) από την πηγή στο υπολειπόμενο δίκτυο
+        dist = [None] * n_nodes; prev = [-1] * n_nodes; in_queue = [False] * n_nodes
+        dist[source] = 0
+        queue = deque([source])
+        while queue:
+            x = queue.popleft(); in_queue[x] = False
+            for e in adj[x]:
+                if cap[e] > 0 and (dist[to[e]] is None or dist[x] + cost[e] < dist[to[e]]):
+                    dist[to[e]] = dist[x] + cost[e]; prev[to[e]] = e
+                    if not in_queue[to[e]]:
+                        in_queue[to[e]] = True; queue.append(to[e])
+        if dist[sink] is None or dist[sink] >= 0:
+            break
+        # Κάθε διαδρομή περνά από ακμή πηγής χωρητικότητας 1: επαύξηση κατά 1
+        x = sink
+        while x != source:
+            e = prev[x]; cap[e] -= 1; cap[e ^ 1] += 1; x = to[e ^ 1]
+
+    return {u: c for u, c, e in assign_edges if cap[e] == 0}
+
+def _broken_dyads(graph: FriendshipIndex, names: List, values) -> int:
+    """Σπασμένες δυάδες για τιμές στήλης (ίδιος κανόνας με το count_broken_dyads)"""
+    name2class = {str(n).strip(): str(v) for n, v in zip(names, values) if pd.notna(v)}
+    return sum(1 for a, b in graph.edges if a not in name2class or name2class[a] != name2class.get(b))
+
+def _place_dyads(candidates: List[Tuple[str, str, str]], values, occupancy: Counter,
+                 rows_of: Dict[str, List[int]]) -> Tuple[Dict[str, str], object]:
+    """
+    Τοποθετεί με τη σειρά των candidates κάθε u (όλες τις γραμμές του) στο τμήμα του φίλου,
+    αν χωράει: μετρά κάθε γραμμή του u που μπαίνει στο τμήμα (διπλό όνομα = πολλές θέσεις).
+    Δουλεύει σε αντίγραφα· επιστρέφει (u -> τμήμα, νέες τιμές στήλης).
+    """
+    values = values.copy()
+    occupancy = occupancy.copy()
+    chosen: Dict[str, str] = {}
+    for u, v, cl in candidates:
+        if u in chosen:
+            continue
+        rows = rows_of.get(u, ())
+        if _class_fits(occupancy, cl, add=sum(1 for pos in rows if values[pos] != cl)):
+            for pos in rows:
+                if pd.notna(values[pos]):
+                    occupancy[values[pos]] -= 1
+                values[pos] = cl
+                occupancy[cl] += 1
+            chosen[u] = cl
+    return chosen, values
 
 def apply_step3_on_sheet(
     df2: pd.DataFrame,
     scenario_col: str,
-    num_classes: Optional[int] = None) -> Tuple[pd.DataFrame, Dict]:
+    num_classes: Optional[int] = None,
+    mode: str = "greedy") -> Tuple[pd.DataFrame, Dict]:
     """
     Παίρνει ένα DataFrame από Βήμα 2 (ένα sheet) και επιστρέφει:
     - df_after: με νέα στήλη ΒΗΜΑ3_ΣΕΝΑΡΙΟ_k (ίδιο όνομα με το sheet αλλά με 'ΒΗΜΑ3')
     - meta: {"broken": int, "penalty": int}
     Κανόνας: τοποθετούμε ΜΟΝΟ δυάδες (u,v) όπου u είναι unplaced, v είναι placed, και είναι αμοιβαία φίλοι.
+    mode: "greedy" (σειρά λιγότερων επιλογών) ή "flow" (μέγιστες διατηρημένες δυάδες προς ήδη
+    τοποθετημένους φίλους, υπό το όριο 25 ανά τμήμα). Ονόματα σε πολλές γραμμές πιάνουν πολλές
+    θέσεις και μένουν εκτός δικτύου: μπαίνουν μετά με τη σειρά του greedy. Το δίκτυο δεν βλέπει
+    δυάδες ανάμεσα σε δύο νέους μαθητές, οπότε συγκρίνεται και με το greedy: κρατείται όποιο
+    σπάει λιγότερες δυάδες (σε ισοπαλία, όποιο κρατά περισσότερες προς τοποθετημένους).
     """
+    if mode not in ("greedy", "flow"):
+        raise ValueError(f"Άγνωστο mode Βήματος 3: {mode!r} (greedy | flow)")
     df = df2.copy()
     # νέα στήλη
     new_col = re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)
@@ -45,46 +139,65 @@ def apply_step3_on_sheet(
     # unplaced υποψήφιοι (γενικά όλοι οι κενές αναθέσεις)
     unplaced_names = df[df[new_col].isna()]["ΟΝΟΜΑ"].astype(str).tolist()
 
-    # δώσε προτεραιότητα σε όσους έχουν ΑΚΡΙΒΩΣ 1 αμοιβαίο φίλο (μονοσήμαντες δυάδες)
-    def mutual_friends_of(u: str) -> list:
-        cell = df.loc[df["ΟΝΟΜΑ"]==u, "ΦΙΛΟΙ"]
-        friends = parse_friends_string(cell.values[0] if not cell.empty else "")
-        return [v for v in friends if are_mutual_pair(df, u, v)]
+    # Γράφος φιλιών μία φορά (ίδια ΟΝΟΜΑ/ΦΙΛΟΙ με το df2) για υποψήφιους και μετρικά
+    graph = FriendshipIndex(df2)
     # κατασκεύασε λίστα (u, v, class_v) για v ήδη placed
     candidates = []
     for u in unplaced_names:
-        for v in mutual_friends_of(u):
+        for v in graph.mutual_friends_of(u):
             if v in placed:
                 candidates.append((u, v, placed[v]))
 
+    # Πληρότητα ανά τμήμα και γραμμές ανά όνομα: κάθε τοποθέτηση κοστίζει O(γραμμών του u)
+    values = df[new_col].to_numpy(dtype=object, copy=True)
+    occupancy = Counter(v for v in values if pd.notna(v))
+    rows_of = defaultdict(list)
+    for pos, name in enumerate(df["ΟΝΟΜΑ"].tolist()):
+        rows_of[name].append(pos)
+
     # Ταξινόμηση: λιγότερες επιλογές πρώτα → μειώνει αδιέξοδα
-    degree = {u: len([1 for x in candidates if x[0]==u]) for u in unplaced_names}
-    candidates.sort(key=lambda t: (degree.get(t[0], 99), t[2]))
+    degree = Counter(u for u, _, _ in candidates)
+    greedy_order = sorted(candidates, key=lambda t: (degree[t[0]], t[2]))
 
-    used_u = set()
-    for u, v, cl in candidates:
-        if u in used_u:
-            continue
-        if _class_fits(df, new_col, cl, add=1):
-            df.loc[df["ΟΝΟΜΑ"]==u, new_col] = cl
-            used_u.add(u)
-            # ενημέρωσε και το placed ώστε αν έχει κι άλλος φίλος τον u, τώρα να θεωρείται placed
-            placed[u] = cl
+    if mode == "flow":
+        # Βάρος (u, τμήμα) = διακριτοί αμοιβαίοι φίλοι του u ήδη σε αυτό το τμήμα
+        friends_in = defaultdict(lambda: defaultdict(set))
+        for u, v, cl in candidates:
+            friends_in[u][cl].add(v)
+        weights = {u: {cl: len(vs) for cl, vs in by_class.items()} for u, by_class in friends_in.items()}
+        single = {u: w for u, w in weights.items() if len(rows_of.get(u, ())) <= 1}
+        capacity = {cl: 25 - occupancy[cl] for by_class in weights.values() for cl in by_class}
+        best = _max_weight_placement(single, capacity)
+        order = [(u, min(friends_in[u][cl], key=str), cl) for u, cl in best.items()]
+        order += [t for t in greedy_order if t[0] not in single]
+        chosen, new_values = _place_dyads(order, values, occupancy, rows_of)
+        greedy_chosen, greedy_values = _place_dyads(greedy_order, values, occupancy, rows_of)
+        names = df["ΟΝΟΜΑ"].tolist()
+        score = lambda placement, vals: (_broken_dyads(graph, names, vals),
+                                         -sum(weights[u][cl] for u, cl in placement.items()))
+        if score(greedy_chosen, greedy_values) < score(chosen, new_values):
+            chosen, new_values = greedy_chosen, greedy_values
+    else:
+        chosen, new_values = _place_dyads(greedy_order, values, occupancy, rows_of)
+    if chosen:
+        df[new_col] = pd.Series(new_values, index=df.index)
 
     # Μετρικά
-    broken = count_broken_dyads(df2, df, new_col)
+    broken = count_broken_dyads(df2, df, new_col, graph)
     num_classes = _auto_num_classes(df, num_classes)
     penalty = calculate_penalty_score_step3(df, new_col, num_classes)
     meta = {"broken": int(broken), "penalty": int(penalty)}
     return df, meta
 
-def apply_step3_to_dataframe(df_step2: pd.DataFrame, num_classes: Optional[int] = None) -> pd.DataFrame:
+def apply_step3_to_dataframe(df_step2: pd.DataFrame, num_classes: Optional[int] = None,
+                             mode: str = "greedy") -> pd.DataFrame:
     """
     ΝΕΑ ΣΥΝΑΡΤΗΣΗ: Εφαρμόζει το Βήμα 3 σε DataFrame (για Streamlit)
     
     Args:
         df_step2: DataFrame από το Βήμα 2 με στήλες ΒΗΜΑ2_ΣΕΝΑΡΙΟ_*
         num_classes: Αριθμός τμημάτων
+        mode: "greedy" ή "flow" (βλ. apply_step3_on_sheet)
     
     Returns:
         DataFrame με επιπλέον στήλες ΒΗΜΑ3_ΣΕΝΑΡΙΟ_*
@@ -101,7 +214,7 @@ def apply_step3_to_dataframe(df_step2: pd.DataFrame, num_classes: Optional[int]
     
     # Εφαρμογή Βήματος 3 σε κάθε στήλη ΒΗΜΑ2
     for scenario_col in step2_columns:
-        df_after, meta = apply_step3_on_sheet(df_step2, scenario_col, num_classes)
+        df_after, meta = apply_step3_on_sheet(df_step2, scenario_col, num_classes, mode=mode)
         
         # Εξαγωγή της νέας στήλης ΒΗΜΑ3
         new_col = re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)
@@ -119,7 +232,7 @@ def apply_step3_to_dataframe(df_step2: pd.DataFrame, num_classes: Optional[int]
     
     return df_result
 
-def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str) -> str:
+def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str, mode: str = "greedy") -> str:
     """
     Διαβάζει το workbook του Βήμα 2 και παράγει νέο workbook για το Βήμα 3
     με ένα sheet ανά σενάριο. Επιστρέφει το path του αρχείου.
@@ -139,7 +252,7 @@ def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str) -> str
     results = []
     for s in s2_sheets:
         df2 = pd.read_excel(p, sheet_name=s)
-        df3, meta = apply_step3_on_sheet(df2, scenario_col=s, num_classes=num_classes)
+        df3, meta = apply_step3_on_sheet(df2, scenario_col=s, num_classes=num_classes, mode=mode)
         results.append((re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", s), df3, meta))
 
     # Επιλογή έως 5 καλύτερων
@@ -158,7 +271,7 @@ def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str) -> str
     return out.as_posix()
 
 # === EXTRA: FULL exporter that works with "ΣΕΝΑΡΙΟ_*" sheets from Step 2 FULL ===
-def export_step3_nextcol_full(step2_xlsx_path: str, out_xlsx_path: str) -> str:
+def export_step3_nextcol_full(step2_xlsx_path: str, out_xlsx_path: str, mode: str = "greedy") -> str:
     """
     Διαβάζει workbook του Βήματος 2 (FULL: φύλλα τύπου 'ΣΕΝΑΡΙΟ_k' που περιέχουν στήλες ΒΗΜΑ2_ΣΕΝΑΡΙΟ_k)
     και παράγει νέο workbook για το Βήμα 3 κρατώντας ΟΛΕΣ τις αρχικές στήλες.
@@ -183,7 +296,7 @@ def export_step3_nextcol_full(step2_xlsx_path: str, out_xlsx_path: str) -> str:
             continue
         scenario_col = s2_cols[0]
         # Εφάρμοσε ΒΗΜΑ 3
-        df3, meta = apply_step3_on_sheet(df2, scenario_col=scenario_col, num_classes=None)
+        df3, meta = apply_step3_on_sheet(df2, scenario_col=scenario_col, num_classes=None, mode=mode)
         # Βάλε τη νέα στήλη δίπλα στη ΒΗΜΑ2
         new_col = re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)
         cols = df3.columns.tolist()
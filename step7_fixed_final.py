@@ -24,6 +24,8 @@ import pandas as pd
 import numpy as np
 import re
 
+from conflict_scoring import conflict_scores
+
 RANDOM_SEED = 42
 random.seed(RANDOM_SEED)
 
@@ -131,33 +133,17 @@ def _pairwise_penalty(counts: Dict[str, int], free: int, weight: int) -> int:
                 penalty += (diff - free) * weight
     return penalty
 
-def _pair_conflict_penalty(aZ, aI, bZ, bI) -> int:
-    """Ποινή παιδαγωγικής σύγκρουσης ανά ζεύγος (unchanged)."""
-    if aI and bI: return 5
-    if (aI and bZ) or (bI and aZ): return 4
-    if aZ and bZ: return 3
-    return 0
-
-def _class_conflict_sum(class_df: pd.DataFrame) -> int:
-    """Συνολική ποινή συγκρούσεων ενός τμήματος (unchanged)."""
-    s = 0
-    rows = class_df[['ΖΩΗΡΟΣ','ΙΔΙΑΙΤΕΡΟΤΗΤΑ']].fillna("").to_dict('records')
-    for i in range(len(rows)):
-        for j in range(i+1, len(rows)):
-            a = rows[i]; b = rows[j]
-            aZ = _is_yes(a.get('ΖΩΗΡΟΣ')); aI = _is_yes(a.get('ΙΔΙΑΙΤΕΡΟΤΗΤΑ'))
-            bZ = _is_yes(b.get('ΖΩΗΡΟΣ')); bI = _is_yes(b.get('ΙΔΙΑΙΤΕΡΟΤΗΤΑ'))
-            s += _pair_conflict_penalty(aZ, aI, bZ, bI)
-    return s
+def _conflict_flags(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    flags = df[['ΖΩΗΡΟΣ','ΙΔΙΑΙΤΕΡΟΤΗΤΑ']].fillna("")
+    return flags['ΖΩΗΡΟΣ'].map(_is_yes).to_numpy(bool), flags['ΙΔΙΑΙΤΕΡΟΤΗΤΑ'].map(_is_yes).to_numpy(bool)
 
 def _all_conflicts_sum(df: pd.DataFrame, scenario_col: str) -> int:
-    """Συνολική ποινή παιδαγωγικών συγκρούσεων (unchanged)."""
-    s = 0
-    for lab, class_df in df.groupby(scenario_col):
-        if not re.match(r"^Α\d+$", str(lab)):
-            continue
-        s += _class_conflict_sum(class_df)
-    return s
+    """Συνολική ποινή παιδαγωγικών συγκρούσεων (μόνο τμήματα Α<n>)."""
+    labels = df[scenario_col]
+    valid = labels.notna() & labels.astype(str).str.match(r"^Α\d+$")
+    codes, uniques = pd.factorize(labels.where(valid))
+    z, i = _conflict_flags(df)
+    return conflict_scores(codes, z, i, len(uniques))[1]
 
 def _mutual_pairs(df: pd.DataFrame) -> List[Tuple[str,str]]:
     """Βρίσκει όλες τις *πλήρως αμοιβαίες* δυάδες από «ΦΙΛΟΙ» (unchanged)."""
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
-from typing import List, Dict, Set, Optional
+from collections import Counter
+from typing import List, Dict, Set, Optional, Tuple
 import pandas as pd, re, ast
 
 # ✅ Βασικοί τίτλοι που κρατάμε σε κάθε minimal export
@@ -67,7 +68,59 @@ def parse_friends_cell(x) -> List[str]:
     parts = SAFE_SEP.split(s)
     return [p.strip() for p in parts if p.strip() and p.strip().lower() != "nan"]
 
-def are_mutual_friends(df: pd.DataFrame, a: str, b: str) -> bool:
+class FriendshipIndex:
+    """
+    Φιλίες ενός πλαισίου με ένα parse ανά γραμμή (ισχύει η πρώτη γραμμή κάθε ονόματος):
+    - friend_lists / friends: όνομα -> φίλοι (λίστα με τη σειρά του κελιού / σύνολο)
+    - edges: ταξινομημένες αμοιβαίες δυάδες (a, b), a <= b, ανάμεσα στα (strip) ονόματα
+    Χτίζεται μία φορά από τον καλούντα και περνιέται ως index= (Βήμα 2) ή graph= (Βήμα 3)
+    όταν γίνονται πολλές ερωτήσεις στο ίδιο πλαίσιο.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        keys = df["ΟΝΟΜΑ"].astype(str).tolist()
+        cells = df["ΦΙΛΟΙ"].tolist() if "ΦΙΛΟΙ" in df.columns else [""] * len(keys)
+        self.friend_lists: Dict[str, List[str]] = {}
+        for key, cell in zip(keys, cells):
+            if key not in self.friend_lists:
+                self.friend_lists[key] = parse_friends_cell(cell)
+        self.friends: Dict[str, Set[str]] = {k: set(v) for k, v in self.friend_lists.items()}
+        self._names = Counter(k.strip() for k in keys)
+        self._edges: Optional[List[Tuple[str, str]]] = None
+
+    def are_mutual(self, a: str, b: str) -> bool:
+        fa, fb = self.friends.get(str(a)), self.friends.get(str(b))
+        if fa is None or fb is None: return False
+        return (str(b).strip() in fa) and (str(a).strip() in fb)
+
+    def mutual_friends_of(self, u: str) -> List[str]:
+        """Οι φίλοι του u (σειρά του κελιού ΦΙΛΟΙ) που τον δηλώνουν κι αυτοί."""
+        return [v for v in self.friend_lists.get(str(u), []) if self.are_mutual(u, v)]
+
+    def mutual_pairs(self, scope: Set[str]) -> List[Tuple[str, str]]:
+        # Γραμμικό στο πλήθος δηλωμένων φιλιών: κάθε ζεύγος (a < b) ελέγχεται από την πλευρά του a
+        pairs = []
+        for a in sorted(scope):
+            for b in sorted(f for f in self.friends.get(a, ()) if f > a and f in scope):
+                if a in self.friends.get(b, ()):
+                    pairs.append((a, b))
+        return pairs
+
+    @property
+    def edges(self) -> List[Tuple[str, str]]:
+        if self._edges is None:
+            edges = set()
+            for a in self._names:
+                for b in self.friends.get(a, ()):
+                    # a == b μόνο για διπλό όνομα που δηλώνει τον εαυτό του (όπως ο έλεγχος ανά ζεύγος)
+                    if b in self._names and (b != a or self._names[a] > 1) and a in self.friends.get(b, ()):
+                        edges.add((a, b) if a <= b else (b, a))
+            self._edges = sorted(edges)
+        return self._edges
+
+def are_mutual_friends(df: pd.DataFrame, a: str, b: str, index: Optional[FriendshipIndex] = None) -> bool:
+    if index is not None:
+        return index.are_mutual(a, b)
     ra = df[df["ΟΝΟΜΑ"].astype(str) == str(a)]
     rb = df[df["ΟΝΟΜΑ"].astype(str) == str(b)]
     if ra.empty or rb.empty: return False
@@ -86,15 +139,13 @@ def scope_step2(df: pd.DataFrame, step1_col: str) -> Set[str]:
             s.add(str(r.get("ΟΝΟΜΑ","")).strip())
     return s
 
-def mutual_pairs_in_scope(df: pd.DataFrame, scope: Set[str]):
+def mutual_pairs_in_scope(df: pd.DataFrame, scope: Set[str], index: Optional[FriendshipIndex] = None):
     scope = {str(x).strip() for x in scope if str(x).strip()}
-    pairs = []
-    names = sorted(scope)
-    for i, a in enumerate(names):
-        for b in names[i+1:]:
-            if are_mutual_friends(df, a, b):
-                pairs.append((a,b))
-    return pairs
+    if len(scope) < 2:
+        return []
+    if index is None:
+        index = FriendshipIndex(df)
+    return index.mutual_pairs(scope)
 
 # --------- ΝΕΑ βοηθητικά για το minimal export ---------
 def extract_step1_id(step1_col_name: str) -> int:
@@ -5,7 +5,11 @@ Step 2 — Ζωηροί & Ιδιαιτερότητες (Fixed v3, patched)
   όπου k είναι ο αριθμός από το step1_col_name (π.χ. ΒΗΜΑ1_ΣΕΝΑΡΙΟ_2 -> k=2).
 - Δεν δημιουργεί FINAL/audit στήλες. Μόνο τη στήλη ΒΗΜΑ2.
 """
-from typing import List, Dict, Tuple, Any, Set, Optional
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Any, Optional
+import heapq
+import time
+import numpy as np
 import pandas as pd
 import random
 import re
@@ -18,61 +22,19 @@ def _auto_num_classes(df, override=None):
     return int(k if override is None else override)
 
 from step_2_helpers_FIXED import (
-    normalize_columns, parse_friends_cell, scope_step2, mutual_pairs_in_scope
+    normalize_columns, parse_friends_cell, scope_step2, mutual_pairs_in_scope, FriendshipIndex
+)
+from conflict_scoring import (
+    NONE, class_conflict_scores, flag_category
 )
 
 RANDOM_SEED = 42
 random.seed(RANDOM_SEED)
 
-def _pair_conflict_penalty(aZ, aI, bZ, bI) -> int:
-    if aI and bI: return 5
-    if (aI and bZ) or (bI and aZ): return 4
-    if aZ and bZ: return 3
-    return 0
-
-def _count_ped_conflicts(df: pd.DataFrame, col: str) -> int:
-    cnt = 0
-    by_class = {}
-    for _, r in df.iterrows():
-        cl = r.get(col)
-        if pd.isna(cl): continue
-        by_class.setdefault(str(cl), []).append(r)
-    for _cl, rows in by_class.items():
-        for i in range(len(rows)):
-            for j in range(i + 1, len(rows)):
-                aZ = str(rows[i].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                aI = str(rows[i].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                bZ = str(rows[j].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                bI = str(rows[j].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                if _pair_conflict_penalty(aZ, aI, bZ, bI) > 0:
-                    cnt += 1
-    return cnt
-
-def _sum_conflicts(df: pd.DataFrame, col: str) -> int:
-    s = 0
-    by_class = {}
-    for _, r in df.iterrows():
-        cl = r.get(col)
-        if pd.isna(cl): continue
-        by_class.setdefault(str(cl), []).append(r)
-    for _cl, rows in by_class.items():
-        for i in range(len(rows)):
-            for j in range(i + 1, len(rows)):
-                aZ = str(rows[i].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                aI = str(rows[i].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                bZ = str(rows[j].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                bI = str(rows[j].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                s += _pair_conflict_penalty(aZ, aI, bZ, bI)
-    return s
-
-def _broken_mutual_pairs(df: pd.DataFrame, col: str, scope: Set[str]) -> int:
-    pairs = mutual_pairs_in_scope(df, scope)
-    name2class = {
-        str(r["ΟΝΟΜΑ"]).strip(): str(r.get(col))
-        for _, r in df.iterrows()
-        if pd.notna(r.get(col))
-    }
-    return sum(1 for a, b in pairs if name2class.get(a) != name2class.get(b))
+# Μέγιστες καταστάσεις στον πίνακα μεταθέσεων (transposition table) του backtracking (LRU)
+TRANSPOSITION_TABLE_SIZE = 100_000
+# Κοντά στα φύλλα το κλειδί κατάστασης κοστίζει περισσότερο από το υπόδεντρο που γλιτώνει
+TRANSPOSITION_MIN_REMAINING = 4
 
 def _compute_targets_global(df: pd.DataFrame, step1_col: str, class_labels: List[str]) -> Dict[str, Dict[str, int]]:
     Z_step1 = {cl: 0 for cl in class_labels}
@@ -109,39 +71,202 @@ def _compute_targets_global(df: pd.DataFrame, step1_col: str, class_labels: List
         "I_step1": I_step1,
     }
 
-def _prereject(assign_map, next_name, next_cl, df, step1_col, class_labels, targets) -> bool:
-    Zc = targets["Z_step1"].copy()
-    Ic = targets["I_step1"].copy()
-    tmp = assign_map.copy()
-    if next_name and next_cl:
-        tmp[next_name] = next_cl
-
-    for n, cl in tmp.items():
-        row = df[df["ΟΝΟΜΑ"] == n].iloc[0]
-        if str(row.get("ΖΩΗΡΟΣ", "")).strip() == "Ν": Zc[cl] += 1
-        if str(row.get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν": Ic[cl] += 1
-
-    for cl in class_labels:
-        if Zc[cl] > targets["Z"]["max"]: return False
-        if Ic[cl] > targets["I"]["max"]: return False
-
-    if next_name and next_cl and "ΣΥΓΚΡΟΥΣΗ" in df.columns:
-        mask_next = (df["ΟΝΟΜΑ"] == next_name)
-        next_conf_cell = df.loc[mask_next, "ΣΥΓΚΡΟΥΣΗ"]
-        toks_next = set(parse_friends_cell(next_conf_cell.values[0] if not next_conf_cell.empty else ""))
-
-        fixed_same = df[(pd.notna(df[step1_col])) & (df[step1_col] == next_cl)]
-        if any((n in toks_next) for n in fixed_same["ΟΝΟΜΑ"].astype(str).tolist()):
-            return False
+class _StudentTable:
+    """
+    Ο πίνακας του Βήματος 2 «μεταγλωττισμένος» μία φορά πριν από το backtracking.
+
+    Κάθε μοναδικό ΟΝΟΜΑ παίρνει ακέραιο id (σειρά πρώτης εμφάνισης) και τα στοιχεία της
+    πρώτης γραμμής του (όπως τα έβλεπε το df[df["ΟΝΟΜΑ"] == n].iloc[0]):
+      • Z, I: πίνακες 0/1 (ΖΩΗΡΟΣ / ΙΔΙΑΙΤΕΡΟΤΗΤΑ)
+      • conflicts: bitset (int) με τα id που αναφέρει στη ΣΥΓΚΡΟΥΣΗ
+      • degree: πλήθος ονομάτων σε ΣΥΓΚΡΟΥΣΗ + ΦΙΛΟΙ (κλειδί ταξινόμησης)
+      • fixed[c]: bitset όσων έχουν (σε κάποια γραμμή) ΒΗΜΑ1 = class_labels[c]
+    Για τη βαθμολόγηση κρατά και ανά γραμμή: row_ids (id του ονόματος), row_Z, row_I.
+    """
 
-        for n2, cl2 in tmp.items():
-            if cl2 != next_cl: continue
-            mask_n2 = (df["ΟΝΟΜΑ"] == n2)
-            n2_conf_cell = df.loc[mask_n2, "ΣΥΓΚΡΟΥΣΗ"]
-            toks2 = set(parse_friends_cell(n2_conf_cell.values[0] if not n2_conf_cell.empty else ""))
-            if (next_name in toks2) or (n2 in toks_next):
-                return False
-    return True
+    def __init__(self, df: pd.DataFrame, step1_col: str, class_labels: List[str]):
+        names_col = df["ΟΝΟΜΑ"].astype(str)
+        first = ~names_col.duplicated().to_numpy()
+        self.names: List[str] = names_col[first].tolist()
+        self.id_of: Dict[str, int] = {n: i for i, n in enumerate(self.names)}
+        rows = df[first]
+        self.row_ids = names_col.map(self.id_of).to_numpy(dtype=np.int64)
+
+        def _flag(col: str) -> np.ndarray:
+            if col not in df.columns:
+                return np.zeros(len(df), dtype=np.int8)
+            return (df[col].astype(str).str.strip() == "Ν").to_numpy(dtype=np.int8)
+
+        def _cells(col: str) -> list:
+            return rows[col].tolist() if col in rows.columns else [""] * len(rows)
+
+        self.row_Z = _flag("ΖΩΗΡΟΣ")
+        self.row_I = _flag("ΙΔΙΑΙΤΕΡΟΤΗΤΑ")
+        self.Z = self.row_Z[first]
+        self.I = self.row_I[first]
+        self.conflicts: List[int] = []
+        degree = []
+        for conf_cell, friends_cell in zip(_cells("ΣΥΓΚΡΟΥΣΗ"), _cells("ΦΙΛΟΙ")):
+            conf_toks = parse_friends_cell(conf_cell)
+            friend_toks = parse_friends_cell(friends_cell)
+            self.conflicts.append(self._mask(conf_toks))
+            degree.append(len(conf_toks) + len(friend_toks))
+        self.degree = np.array(degree, dtype=np.int64)
+
+        label_idx = {cl: c for c, cl in enumerate(class_labels)}
+        self.fixed: List[int] = [0] * len(class_labels)
+        for name, cl in zip(names_col, df[step1_col]):
+            if pd.notna(cl) and cl in label_idx:
+                self.fixed[label_idx[cl]] |= 1 << self.id_of[name]
+
+    def _mask(self, tokens: List[str]) -> int:
+        mask = 0
+        for tok in tokens:
+            sid = self.id_of.get(tok)
+            if sid is not None:
+                mask |= 1 << sid
+        return mask
+
+    def ids(self, names: List[str]) -> List[int]:
+        return [self.id_of[n] for n in names]
+
+    def rows_of(self, sid: int) -> np.ndarray:
+        return np.flatnonzero(self.row_ids == sid)
+
+
+class _PlacementChecker:
+    """
+    Κατάσταση του backtracking του Βήματος 2, ενημερώνεται σε κάθε place/remove:
+      • Zc, Ic: ζωηροί / ιδιαιτερότητες ανά τμήμα (ΒΗΜΑ1 + όσοι έχουν τοποθετηθεί)
+      • occupied[c]: bitset όλων στο τμήμα c (ΒΗΜΑ1 + ΒΗΜΑ2)
+      • blocked[c]: ένωση των ΣΥΓΚΡΟΥΣΗ των τοποθετημένων στο ΒΗΜΑ2 του τμήματος c
+      • flags[cat][c]: γραμμές ανά κατηγορία (conflict_scoring.flag_category) στο τμήμα c
+    Έτσι ο έλεγχος εφικτότητας (can_place) κοστίζει O(1).
+    """
+
+    def __init__(self, table: _StudentTable, class_labels: List[str], targets,
+                 step1_values, to_place: List[int]):
+        self.table = table
+        self.z_max = targets["Z"]["max"]
+        self.i_max = targets["I"]["max"]
+        self.z_min = targets["Z"]["q"]
+        self.i_min = targets["I"]["q"]
+        self.Zc = [targets["Z_step1"][cl] for cl in class_labels]
+        self.Ic = [targets["I_step1"][cl] for cl in class_labels]
+        self.counts = [0] * len(class_labels)  # τοποθετήσεις ΒΗΜΑ2 ανά τμήμα
+        self.occupied = list(table.fixed)
+        self.blocked = [0] * len(class_labels)
+        self._undo: List[Tuple[int, int]] = []
+        # Αν ήδη το ΒΗΜΑ1 ξεπερνά το μέγιστο σε κάποιο τμήμα, καμία τοποθέτηση δεν είναι εφικτή
+        self._base_ok = max(self.Zc) <= self.z_max and max(self.Ic) <= self.i_max
+
+        # Σταθερές γραμμές (ΒΗΜΑ1) ανά κατηγορία· όλες οι γραμμές ενός ονόματος προς
+        # τοποθέτηση παίρνουν το τμήμα του, άρα μετρώνται στο place/remove (id_flags)
+        moving = set(to_place)
+        # Ζωηροί / ιδιαιτερότητες που μένουν να τοποθετηθούν (forward checking στα ελάχιστα)
+        self.rem_Z = int(sum(table.Z[sid] for sid in moving))
+        self.rem_I = int(sum(table.I[sid] for sid in moving))
+        label_idx = {cl: c for c, cl in enumerate(class_labels)}
+        self.flags = [[0] * len(class_labels) for _ in range(3)]
+        self.id_flags: Dict[int, List[int]] = {sid: [0, 0, 0] for sid in moving}
+        for sid, z, i, cl in zip(table.row_ids, table.row_Z, table.row_I, step1_values):
+            cat = flag_category(z, i)
+            if cat == NONE:
+                continue
+            if sid in moving:
+                self.id_flags[sid][cat] += 1
+            elif pd.notna(cl) and str(cl) in label_idx:
+                self.flags[cat][label_idx[str(cl)]] += 1
+
+    def can_place(self, sid: int, c: int) -> bool:
+        if not self._base_ok:
+            return False
+        t = self.table
+        if self.Zc[c] + t.Z[sid] > self.z_max: return False
+        if self.Ic[c] + t.I[sid] > self.i_max: return False
+        bit = 1 << sid
+        # Ο επόμενος δηλώνει σύγκρουση με κάποιον ήδη στο τμήμα (ΒΗΜΑ1 ή ΒΗΜΑ2)
+        if t.conflicts[sid] & (self.occupied[c] | bit): return False
+        # Κάποιος τοποθετημένος στο ΒΗΜΑ2 του τμήματος δηλώνει σύγκρουση με τον επόμενο
+        if self.blocked[c] & bit: return False
+        return True
+
+    def place(self, sid: int, c: int) -> None:
+        t = self.table
+        self._undo.append((self.occupied[c], self.blocked[c]))
+        self.Zc[c] += t.Z[sid]
+        self.Ic[c] += t.I[sid]
+        self.counts[c] += 1
+        self.rem_Z -= t.Z[sid]
+        self.rem_I -= t.I[sid]
+        self.occupied[c] |= 1 << sid
+        self.blocked[c] |= t.conflicts[sid]
+        for cat, n in enumerate(self.id_flags[sid]):
+            self.flags[cat][c] += n
+
+    def remove(self, sid: int, c: int) -> None:
+        t = self.table
+        self.occupied[c], self.blocked[c] = self._undo.pop()
+        self.Zc[c] -= t.Z[sid]
+        self.Ic[c] -= t.I[sid]
+        self.counts[c] -= 1
+        self.rem_Z += t.Z[sid]
+        self.rem_I += t.I[sid]
+        for cat, n in enumerate(self.id_flags[sid]):
+            self.flags[cat][c] -= n
+
+    def minimums_reachable(self) -> bool:
+        """Μπορούν οι υπόλοιποι ζωηροί / ιδιαιτερότητες να φέρουν κάθε τμήμα στο ελάχιστο q;"""
+        need_z = sum(self.z_min - z for z in self.Zc if z < self.z_min)
+        need_i = sum(self.i_min - i for i in self.Ic if i < self.i_min)
+        return need_z <= self.rem_Z and need_i <= self.rem_I
+
+    def symmetry_groups(self, exposed: int) -> List[Optional[int]]:
+        """
+        Ομάδα ανά τμήμα για symmetry breaking: τμήματα χωρίς τοποθετήσεις ΒΗΜΑ2, με ίδια
+        κατάσταση ΒΗΜΑ1 (Z/I και κατηγορίες) και χωρίς μαθητή ΒΗΜΑ1 που «βλέπουν» οι προς
+        τοποθέτηση (exposed: ΣΥΓΚΡΟΥΣΗ / αμοιβαία φιλία) είναι εναλλάξιμα.
+        None = το τμήμα ξεχωρίζει από όλα τα άλλα.
+        """
+        groups: List[Optional[int]] = []
+        seen: Dict[Tuple[int, ...], int] = {}
+        for c in range(len(self.counts)):
+            if self.counts[c] or self.occupied[c] & exposed:
+                groups.append(None)
+                continue
+            signature = (self.Zc[c], self.Ic[c]) + tuple(f[c] for f in self.flags)
+            groups.append(seen.setdefault(signature, len(seen)))
+        return groups
+
+    def state(self, relevant: int, unplaced: int) -> Tuple:
+        """
+        Ό,τι καθορίζει το υπόδεντρο: μετρητές ανά τμήμα και, από τα bitsets, μόνο όσα
+        «βλέπουν» οι μη τοποθετημένοι (relevant: ΣΥΓΚΡΟΥΣΗ/φίλοι τους, unplaced: οι ίδιοι).
+        """
+        return (tuple(self.Zc), tuple(self.Ic), tuple(self.counts),
+                tuple(tuple(f) for f in self.flags),
+                tuple(o & relevant for o in self.occupied),
+                tuple(b & unplaced for b in self.blocked))
+
+    def conflict_scores(self) -> Tuple[int, int]:
+        """(παιδαγωγικές συγκρούσεις, άθροισμα ποινών) της τρέχουσας κατανομής"""
+        ped = penalty = 0
+        for counts in zip(*self.flags):
+            p, s = class_conflict_scores(*counts)
+            ped += p
+            penalty += s
+        return ped, penalty
+
+def _selection_key(ped_cnt: int, broken: int, total: int) -> Tuple[int, int, int]:
+    """
+    Κριτήριο επιλογής (μικρότερο = καλύτερο): πρώτα τα σενάρια χωρίς παιδαγωγικές
+    συγκρούσεις με τις λιγότερες σπασμένες φιλίες και μετά τη μικρότερη ποινή·
+    αλλιώς η μικρότερη ποινή και μετά οι λιγότερες σπασμένες φιλίες.
+    Μονότονο ως προς ped_cnt/broken/total, άρα δίνει και κάτω φράγμα για μερικές κατανομές.
+    """
+    if ped_cnt == 0:
+        return (0, broken, total)
+    return (1, total, broken)
 
 def _extract_step1_id(step1_col_name: str) -> int:
     m = re.search(r'(?:ΒΗΜΑ1_|V1_)ΣΕΝΑΡΙΟ[_\s]*(\d+)', str(step1_col_name))
@@ -154,13 +279,29 @@ def step2_apply_FIXED_v3(
     *,
     seed: int = 42,
     max_results: int = 5,
+    time_budget: Optional[float] = None,
+    node_budget: Optional[int] = None,
+    normalized: bool = False,
+    friends: Optional[FriendshipIndex] = None,
 ) -> List[Tuple[str, pd.DataFrame, Dict[str, Any]]]:
     """
     Επιστρέφει έως max_results σενάρια ως (label, DataFrame, metrics).
     Το DataFrame περιέχει στήλες εισόδου + «ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{k}» όπου k = id του ΒΗΜΑ1_ΣΕΝΑΡΙΟ_k.
+
+    time_budget (δευτερόλεπτα) / node_budget (κόμβοι): anytime αναζήτηση — όταν εξαντληθεί
+    το όριο επιστρέφονται τα καλύτερα σενάρια που βρέθηκαν ως τότε. Τα metrics περιέχουν
+    επίσης nodes_explored, pruned_branches και search_complete.
+
+    normalized=True: το df_in έχει ήδη περάσει από normalize_columns και χρησιμοποιείται
+    ως έχει (μόνο ανάγνωση, χωρίς αντίγραφο).
+
+    friends: FriendshipIndex του ίδιου πλαισίου (ΟΝΟΜΑ/ΦΙΛΟΙ), ώστε πολλά σενάρια της
+    ίδιας βάσης να μη ξαναδιαβάζουν τις φιλίες· αν λείπει χτίζεται εδώ.
     """
+    # Το χρονικό όριο μετρά από την είσοδο (περιλαμβάνει και την προετοιμασία)
+    deadline = None if time_budget is None else time.monotonic() + time_budget
     random.seed(seed)
-    df = normalize_columns(df_in).copy()
+    df = df_in if normalized else normalize_columns(df_in).copy()
     num_classes = _auto_num_classes(df, num_classes)
     class_labels = [f"Α{i+1}" for i in range(num_classes)]
     scope = scope_step2(df, step1_col=step1_col_name)
@@ -168,99 +309,254 @@ def step2_apply_FIXED_v3(
     to_place = df[(pd.isna(df[step1_col_name])) & ((df["ΖΩΗΡΟΣ"] == "Ν") | (df["ΙΔΙΑΙΤΕΡΟΤΗΤΑ"] == "Ν"))]["ΟΝΟΜΑ"].astype(str).tolist()
     targets = _compute_targets_global(df, step1_col=step1_col_name, class_labels=class_labels)
 
-    best: List[Tuple[pd.DataFrame, int, int, int, int]] = []
-    assign: Dict[str, str] = {}
-
-    def deg(name: str) -> int:
-        row = df[df["ΟΝΟΜΑ"] == name].iloc[0]
-        return len(parse_friends_cell(row.get("ΣΥΓΚΡΟΥΣΗ", ""))) + len(parse_friends_cell(row.get("ΦΙΛΟΙ", "")))
+    # Φραγμένος max-heap των max_results καλύτερων φύλλων κατά (_selection_key, σειρά εύρεσης):
+    # (αρνητικό κλειδί, τμήματα κατά to_place_sorted, ped, broken, total, conf_sum)
+    max_results = max(1, int(max_results))
+    best: List[Tuple[Tuple[int, ...], Tuple[int, ...], int, int, int, int]] = []
+    best_key: List[Optional[Tuple[int, int, int]]] = [None]  # καλύτερο κλειδί μέχρι τώρα
+    table = _StudentTable(df, step1_col_name, class_labels)
+    assign: Dict[int, int] = {}  # id μαθητή -> δείκτης τμήματος
 
+    Z, I, degree = table.Z, table.I, table.degree
     to_place_sorted = sorted(
-        to_place,
-        key=lambda n: (
-            -(
-                str(df.loc[df["ΟΝΟΜΑ"] == n, "ΖΩΗΡΟΣ"].values[0]).strip() == "Ν"
-                and str(df.loc[df["ΟΝΟΜΑ"] == n, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ"].values[0]).strip() == "Ν"
-            ),
-            -(str(df.loc[df["ΟΝΟΜΑ"] == n, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ"].values[0]).strip() == "Ν"),
-            -(str(df.loc[df["ΟΝΟΜΑ"] == n, "ΖΩΗΡΟΣ"].values[0]).strip() == "Ν"),
-            -deg(n),
-        ),
+        table.ids(to_place),
+        key=lambda s: (-(Z[s] & I[s]), -I[s], -Z[s], -degree[s]),
     )
 
-    def backtrack(i: int) -> None:
+    step1_values = df[step1_col_name].tolist()
+    checker = _PlacementChecker(table, class_labels, targets, step1_values, to_place_sorted)
+
+    # Αμοιβαίες φιλίες του scope: όσες δεν αγγίζουν μαθητή προς τοποθέτηση μετρώνται μία φορά
+    mutual_pairs = mutual_pairs_in_scope(df, scope, friends)
+    moving = set(to_place_sorted)
+    static_class: Dict[int, str] = {}  # id -> τμήμα ΒΗΜΑ1 (τελευταία μη κενή γραμμή)
+    for sid, cl in zip(table.row_ids, step1_values):
+        if pd.notna(cl):
+            static_class[sid] = str(cl)
+    broken_static = 0
+    partners: Dict[int, List[int]] = {sid: [] for sid in moving}
+    for a, b in mutual_pairs:
+        ia, ib = table.id_of[a], table.id_of[b]
+        if ia in moving:
+            partners[ia].append(ib)
+        if ib in moving:
+            partners[ib].append(ia)
+        if ia not in moving and ib not in moving and static_class.get(ia) != static_class.get(ib):
+            broken_static += 1
+
+    def class_of(sid: int) -> Optional[str]:
+        return class_labels[assign[sid]] if sid in assign else static_class.get(sid)
+
+    # Σπασμένες φιλίες ήδη οριστικές (και τα δύο μέλη με τμήμα) — αυξάνουν μόνο με τη διάσπαση
+    broken_now = [broken_static]
+
+    def newly_broken(sid: int) -> int:
+        """Φιλίες του sid (μόλις τοποθετήθηκε) με ήδη τοποθετημένους/σταθερούς σε άλλο τμήμα"""
+        mine = class_of(sid)
+        return sum(1 for p in partners[sid]
+                   if (p in assign or p not in moving) and class_of(p) != mine)
+
+    def pruned_leaf(ped_cnt: int, broken: int, conf_sum: int) -> bool:
+        """Αποκλείεται ένα (ακριβές) κλειδί φύλλου από το αποτέλεσμα;"""
+        if best_key[0] is None:
+            return False
+        key = _selection_key(ped_cnt, broken, conf_sum + 5 * broken)
+        if key > best_key[0]:
+            return True  # δεν μπορεί ούτε να ισοφαρίσει το καλύτερο
+        return len(best) >= max_results and key >= tuple(-x for x in best[0][0][:3])
+
+    def pruned(ped_cnt: int, conf_sum: int) -> bool:
+        """Κάτω φράγμα του κλειδιού για κάθε συμπλήρωση: ped, ποινή και σπασμένες μόνο αυξάνουν"""
+        return pruned_leaf(ped_cnt, broken_now[0], conf_sum)
+
+    # Εναλλάξιμα τμήματα: σε κάθε κόμβο δοκιμάζεται μόνο το πρώτο ανέγγιχτο της ομάδας του
+    # (οι μεταθέσεις ετικετών δίνουν ισοδύναμες κατανομές με το ίδιο κλειδί)
+    exposed = 0
+    for sid in moving:
+        exposed |= table.conflicts[sid] | (1 << sid)
+        for p in partners[sid]:
+            exposed |= 1 << p
+    groups = checker.symmetry_groups(exposed)
+
+    # Πίνακας μεταθέσεων: ίδια κατάσταση (τοποθετημένοι, μετρητές, έκθεση σε συγκρούσεις/φιλίες)
+    # από άλλο μονοπάτι δίνει ισόμορφο υπόδεντρο που διαφέρει μόνο στις ήδη σπασμένες φιλίες.
+    # κατάσταση -> (ελάχιστες σπασμένες με τις οποίες εξερευνήθηκε,
+    #               κάτω φράγμα φύλλων (ped, νέες σπασμένες, ποινή) ή None αν ανέφικτο)
+    transpositions: "OrderedDict[Tuple, Tuple[int, Optional[Tuple[int, int, int]]]]" = OrderedDict()
+    partner_mask = {sid: sum(1 << p for p in set(partners[sid])) for sid in moving}
+    placed = [0]  # bitset τοποθετημένων
+
+    def state_key() -> Tuple:
+        relevant = unplaced = 0
+        for s in to_place_sorted:
+            if s not in assign:
+                unplaced |= 1 << s
+                relevant |= table.conflicts[s] | partner_mask[s]
+        return (placed[0], checker.state(relevant, unplaced))
+
+    def lower(a: Optional[Tuple[int, int, int]], b: Optional[Tuple[int, int, int]]):
+        """Το μικρότερο (κατά κλειδί επιλογής) από δύο (ped, σπασμένες, ποινή)· None = κανένα"""
+        if a is None:
+            return b
+        if b is None:
+            return a
+        key_a = _selection_key(a[0], a[1], a[2] + 5 * a[1])
+        key_b = _selection_key(b[0], b[1], b[2] + 5 * b[1])
+        return b if key_b < key_a else a
+
+    seq = [0]
+    stats = {"nodes": 0, "pruned": 0, "stopped": False}
+
+    def out_of_budget() -> bool:
+        """Μετρά έναν κόμβο· True (και από εκεί και πέρα) όταν εξαντληθεί το όριο"""
+        if stats["stopped"]:
+            return True
+        stats["nodes"] += 1
+        if node_budget is not None and stats["nodes"] > node_budget:
+            stats["stopped"] = True
+        elif deadline is not None and stats["nodes"] % 256 == 0 and time.monotonic() > deadline:
+            stats["stopped"] = True
+        return stats["stopped"]
+
+    def backtrack(i: int) -> Optional[Tuple[int, int, int]]:
+        """
+        Εξερευνά το υπόδεντρο. Επιστρέφει κάτω φράγμα (ped, σπασμένες, ποινή) για κάθε
+        εφικτό φύλλο του (φύλλα που βρέθηκαν και φράγματα κλαδεμένων κλάδων) ή None αν δεν έχει.
+        """
         if i == len(to_place_sorted):
-            cand = df.copy()
-            cand_col = "ΒΗΜΑ2_TMP"
-            cand[cand_col] = cand[step1_col_name]
-            for n, cl in assign.items():
-                cand.loc[cand["ΟΝΟΜΑ"] == n, cand_col] = cl
-
-            counts_new = {cl: 0 for cl in class_labels}
-            for cl in assign.values():
-                counts_new[cl] += 1
-            if sum(counts_new.values()) > 0 and max(counts_new.values()) == sum(counts_new.values()):
-                return
-
-            Zc = targets["Z_step1"].copy()
-            Ic = targets["I_step1"].copy()
-            for n, cl in assign.items():
-                row = df[df["ΟΝΟΜΑ"] == n].iloc[0]
-                if str(row.get("ΖΩΗΡΟΣ", "")).strip() == "Ν": Zc[cl] += 1
-                if str(row.get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν": Ic[cl] += 1
-            for cl in class_labels:
-                if not (targets["Z"]["q"] <= Zc[cl] <= targets["Z"]["max"]): return
-                if not (targets["I"]["q"] <= Ic[cl] <= targets["I"]["max"]): return
-
-            ped_cnt = _count_ped_conflicts(cand, cand_col)
-            conf_sum = _sum_conflicts(cand, cand_col)
-            broken = _broken_mutual_pairs(cand, cand_col, scope)
-            total = conf_sum + 5 * broken
-            best.append((cand, ped_cnt, broken, total, conf_sum))
-            return
+            counts_new = checker.counts
+            if sum(counts_new) > 0 and max(counts_new) == sum(counts_new):
+                return None
+
+            for c in range(num_classes):
+                if not (targets["Z"]["q"] <= checker.Zc[c] <= targets["Z"]["max"]): return None
+                if not (targets["I"]["q"] <= checker.Ic[c] <= targets["I"]["max"]): return None
 
-        name = to_place_sorted[i]
-        for cl in class_labels:
-            if not _prereject(assign, name, cl, df, step1_col_name, class_labels, targets):
+            ped_cnt, conf_sum = checker.conflict_scores()
+            broken = broken_now[0]
+            total = conf_sum + 5 * broken
+            key = _selection_key(ped_cnt, broken, total)
+            seq[0] += 1
+            entry = (tuple(-x for x in key) + (-seq[0],),
+                     tuple(assign[s] for s in to_place_sorted), ped_cnt, broken, total, conf_sum)
+            if len(best) < max_results:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heappushpop(best, entry)
+            if best_key[0] is None or key < best_key[0]:
+                best_key[0] = key
+            return ped_cnt, broken, conf_sum
+
+        # Forward checking: αδιέξοδο αν δεν πιάνονται τα ελάχιστα Z/I ή αν κάποιος
+        # μαθητής δεν χωρά πουθενά. MRV: επόμενος ο μαθητής με τα λιγότερα εφικτά τμήματα
+        # (ισοπαλία: η στατική σειρά Z∧I, I, Z, βαθμός).
+        if not checker.minimums_reachable():
+            stats["pruned"] += 1
+            return None
+
+        if len(to_place_sorted) - i < TRANSPOSITION_MIN_REMAINING:
+            return expand(i)
+        state = state_key()
+        seen = transpositions.get(state)
+        seen_broken = broken_now[0]
+        if seen is not None:
+            transpositions.move_to_end(state)
+            seen_broken, seen_bound = seen
+            if seen_bound is None:
+                stats["pruned"] += 1
+                return None  # ανέφικτο υπόδεντρο
+            # Κάθε φύλλο εδώ = φύλλο εκεί με (broken_now - seen_broken) επιπλέον σπασμένες
+            ped_cnt, broken, conf_sum = seen_bound
+            bound = (ped_cnt, broken + broken_now[0], conf_sum)
+            if seen_broken < broken_now[0] or pruned_leaf(*bound):
+                stats["pruned"] += 1
+                return bound
+            seen_broken = min(seen_broken, broken_now[0])
+
+        bound = expand(i)
+        if not stats["stopped"]:
+            if bound is not None:
+                bound = (bound[0], bound[1] - broken_now[0], bound[2])
+            transpositions[state] = (seen_broken, bound)
+            transpositions.move_to_end(state)
+            if len(transpositions) > TRANSPOSITION_TABLE_SIZE:
+                transpositions.popitem(last=False)
+            if bound is not None:
+                bound = (bound[0], bound[1] + broken_now[0], bound[2])
+        return bound
+
+    def expand(i: int) -> Optional[Tuple[int, int, int]]:
+        sid, options = None, None
+        for s in to_place_sorted:
+            if s in assign:
                 continue
-            assign[name] = cl
-            backtrack(i + 1)
-            del assign[name]
+            feasible = [c for c in range(num_classes) if checker.can_place(s, c)]
+            if not feasible:
+                stats["pruned"] += 1
+                return None
+            if options is None or len(feasible) < len(options):
+                sid, options = s, feasible
+                if len(options) == 1:
+                    break
+
+        bound = None
+        tried_groups = set()
+        for c in options:
+            if groups[c] is not None and checker.counts[c] == 0:
+                if groups[c] in tried_groups:
+                    continue
+                tried_groups.add(groups[c])
+            if out_of_budget():
+                return bound
+            assign[sid] = c
+            placed[0] |= 1 << sid
+            checker.place(sid, c)
+            delta = newly_broken(sid)
+            broken_now[0] += delta
+            ped_cnt, conf_sum = checker.conflict_scores()
+            if pruned(ped_cnt, conf_sum):
+                stats["pruned"] += 1
+                bound = lower(bound, (ped_cnt, broken_now[0], conf_sum))
+            else:
+                bound = lower(bound, backtrack(i + 1))
+            broken_now[0] -= delta
+            checker.remove(sid, c)
+            placed[0] &= ~(1 << sid)
+            del assign[sid]
+        return bound
 
     backtrack(0)
+    search_metrics = {
+        "nodes_explored": stats["nodes"] - (1 if stats["stopped"] else 0),
+        "pruned_branches": stats["pruned"],
+        "search_complete": not stats["stopped"],
+    }
 
     if not best:
         tmp = df.copy()
         base_id = _extract_step1_id(step1_col_name)
         tmp[f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{base_id}"] = tmp[step1_col_name]
-        return [("option_1", tmp, {"ped_conflicts": None, "broken": None, "penalty": None})]
-
-    zero_ped = [x for x in best if x[1] == 0]
-    selected = []
-
-    total_pairs = len(mutual_pairs_in_scope(df, scope))
-
-    if zero_ped:
-        min_broken = min(x[2] for x in zero_ped)
-        tier1 = [x for x in zero_ped if x[2] == min_broken]
-        min_total = min(x[3] for x in tier1)
-        tier2 = [x for x in tier1 if x[3] == min_total]
-        selected = tier2
-    else:
-        min_total = min(x[3] for x in best)
-        tier1 = [x for x in best if x[3] == min_total]
-        max_preserved = max(total_pairs - x[2] for x in tier1)
-        tier2 = [x for x in tier1 if (total_pairs - x[2]) == max_preserved]
-        selected = tier2
+        return [("option_1", tmp, {"ped_conflicts": None, "broken": None, "penalty": None, **search_metrics})]
+
+    # Ισοβαθμίες του καλύτερου κλειδιού, με τη σειρά εύρεσης
+    kept = sorted(best, reverse=True)
+    selected = [x[1:] for x in kept if x[0][:3] == kept[0][0][:3]]
 
     results: List[Tuple[str, pd.DataFrame, Dict[str, Any]]] = []
     base_id = _extract_step1_id(step1_col_name)
-    for k, (cand, ped_cnt, broken, total, conf_sum) in enumerate(selected, start=1):
-        out = cand.copy()
-        final_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{base_id}"
-        out[final_col] = out["ΒΗΜΑ2_TMP"]
-        out.drop(columns=["ΒΗΜΑ2_TMP"], inplace=True)
+    final_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{base_id}"
+    for k, (classes, ped_cnt, broken, total, conf_sum) in enumerate(selected, start=1):
+        # Μόνο τα επιλεγμένα σενάρια γίνονται DataFrame
+        out = df.copy()
+        if classes:
+            values = df[step1_col_name].to_numpy(dtype=object, copy=True)
+            for sid, c in zip(to_place_sorted, classes):
+                values[table.rows_of(sid)] = class_labels[c]
+            out[final_col] = pd.Series(values, index=df.index)
+        else:
+            out[final_col] = df[step1_col_name]
         results.append((f"option_{k}", out, {
             "ped_conflicts": int(ped_cnt), "broken": int(broken), "penalty": int(total),
+            **search_metrics,
         }))
     return results
@@ -3,15 +3,16 @@
 """
 step_3_helpers_FIXED.py
 - ΦΙΛΟΙ parsing από string ή list
-- Έλεγχος ΑΜΟΙΒΑΙΑΣ φιλίας (μόνο ΔΥΑΔΕΣ)
+- Έλεγχος ΑΜΟΙΒΑΙΑΣ φιλίας (μόνο ΔΥΑΔΕΣ), προαιρετικά μέσω FriendshipIndex (κοινό με το Βήμα 2)
 - Μέτρηση «σπασμένων» φιλικών ΔΥΑΔΩΝ (χωρίς διπλομέτρηση)
 - Penalty score για Βήμα 3
 - Επιλογή σεναρίων βάσει θεωρίας
 """
 
-from typing import List, Tuple, Dict, Set
+from typing import List, Tuple, Dict, Set, Optional
 import pandas as pd
 import re, ast
+from step_2_helpers_FIXED import FriendshipIndex
 
 SAFE_SEP = re.compile(r"[,\|\;/·\n]+")
 
@@ -34,7 +35,9 @@ def parse_friends_string(x) -> List[str]:
     parts = SAFE_SEP.split(s)
     return [p.strip() for p in parts if p.strip() and p.strip().lower()!="nan"]
 
-def are_mutual_pair(df: pd.DataFrame, a: str, b: str) -> bool:
+def are_mutual_pair(df: pd.DataFrame, a: str, b: str, graph: Optional[FriendshipIndex] = None) -> bool:
+    if graph is not None:
+        return graph.are_mutual(a, b)
     ra = df[df["ΟΝΟΜΑ"].astype(str)==str(a)]
     rb = df[df["ΟΝΟΜΑ"].astype(str)==str(b)]
     if ra.empty or rb.empty:
@@ -43,18 +46,16 @@ def are_mutual_pair(df: pd.DataFrame, a: str, b: str) -> bool:
     fb = set(parse_friends_string(rb.iloc[0].get("ΦΙΛΟΙ","")))
     return (str(b).strip() in fa) and (str(a).strip() in fb)
 
-def mutual_dyads(df: pd.DataFrame) -> Set[Tuple[str,str]]:
-    names = df["ΟΝΟΜΑ"].astype(str).str.strip().tolist()
-    pairs: Set[Tuple[str,str]] = set()
-    for i, a in enumerate(names):
-        for b in names[i+1:]:
-            if are_mutual_pair(df, a, b):
-                pairs.add(tuple(sorted([a,b])))
-    return pairs
+def mutual_dyads(df: pd.DataFrame, graph: Optional[FriendshipIndex] = None) -> Set[Tuple[str,str]]:
+    return set((graph or FriendshipIndex(df)).edges)
 
-def count_broken_dyads(before_df: pd.DataFrame, after_df: pd.DataFrame, scenario_col: str) -> int:
-    """Μετρά πόσες αμοιβαίες ΔΥΑΔΕΣ σπάνε στο after_df (δηλ. κατανέμονται σε διαφορετικές τάξεις)."""
-    pairs = mutual_dyads(before_df)
+def count_broken_dyads(before_df: pd.DataFrame, after_df: pd.DataFrame, scenario_col: str,
+                       graph: Optional[FriendshipIndex] = None) -> int:
+    """
+    Μετρά πόσες αμοιβαίες ΔΥΑΔΕΣ σπάνε στο after_df (δηλ. κατανέμονται σε διαφορετικές τάξεις).
+    graph: έτοιμο FriendshipIndex του before_df (αλλιώς χτίζεται εδώ).
+    """
+    pairs = mutual_dyads(before_df, graph)
     name2class = {str(r["ΟΝΟΜΑ"]).strip(): str(r.get(scenario_col)) for _, r in after_df.iterrows() if pd.notna(r.get(scenario_col))}
     broken=0
     for a,b in pairs:
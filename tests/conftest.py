@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+import sys
+from pathlib import Path
+
+# Τα modules του project είναι επίπεδα αρχεία στη ρίζα του repo
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from step1_immutable_ALLINONE import Step1Results, Step1ResultsCache, Step1Scenario
+
+
+def _results(metadata=None) -> Step1Results:
+    scenario = Step1Scenario(
+        id=1, column_name="ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1", assignments={"Α": "Α1", "Β": "Α2"},
+        description="", broken_friendships=0, metadata=metadata or {},
+    )
+    return Step1Results(
+        scenarios=(scenario,), friendships=frozenset(), teacher_kids=("Α", "Β"),
+        num_classes=2, creation_timestamp="2024-01-01T00:00:00",
+    )
+
+
+def test_key_depends_on_teacher_kid_order():
+    friendships = {("Α", "Β")}
+    assert Step1ResultsCache.make_key(["Α", "Β"], friendships, 2) != \
+        Step1ResultsCache.make_key(["Β", "Α"], friendships, 2)
+    assert Step1ResultsCache.make_key(["Α", "Β"], friendships, 2) == \
+        Step1ResultsCache.make_key(["Α", "Β"], {("Β", "Α")}, 2)
+
+
+def test_key_includes_algorithm_version(monkeypatch):
+    before = Step1ResultsCache.make_key(["Α"], set(), 2)
+    monkeypatch.setattr(Step1ResultsCache, "ALGORITHM_VERSION", "other")
+    assert Step1ResultsCache.make_key(["Α"], set(), 2) != before
+
+
+def test_put_roundtrip_and_unserialisable_content_leaves_no_files(tmp_path):
+    cache = Step1ResultsCache(tmp_path)
+    cache.put("ok", _results())
+    assert cache.get("ok").scenarios[0].assignments == {"Α": "Α1", "Β": "Α2"}
+
+    with pytest.raises(TypeError):
+        cache.put("bad", _results({"x": object()}))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ok.json"]
+
+
+def test_default_directory_is_outside_the_package(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert Step1ResultsCache().directory == tmp_path / "step1_immutable"
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import copy
+import pickle
+
+import pandas as pd
+
+from step1_immutable_ALLINONE import (
+    CompactStep1Scenario, Step1ResultsCache, Step1Scenario, create_immutable_step1,
+)
+
+
+def _frame() -> pd.DataFrame:
+    names = ["Α", "Β", "Γ", "Δ", "Ε", "Ζ"]
+    friends = {"Α": "Β", "Β": "Α", "Γ": "Δ", "Δ": "Γ"}
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": ["Α", "Κ"] * 3,
+        "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ": ["Ν"] * 6,
+        "ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ": ["Ν", "Ν", "Ν", "Ν", "Ν", "Ο"],
+        "ΦΙΛΟΙ": [friends.get(n, "") for n in names],
+    })
+
+
+def test_compact_scenarios_match_dict_scenarios_without_categorical_columns():
+    df_plain, plain = create_immutable_step1(_frame(), num_classes=2)
+    df_compact, compact = create_immutable_step1(_frame(), num_classes=2, compact=True)
+
+    assert all(isinstance(s, Step1Scenario) for s in plain.scenarios)
+    assert all(isinstance(s, CompactStep1Scenario) for s in compact.scenarios)
+    assert [dict(s.assignments) for s in compact.scenarios] == [s.assignments for s in plain.scenarios]
+    assert df_compact.equals(df_plain)
+
+
+def test_categorical_columns_are_independent_of_compact():
+    df_cat, results = create_immutable_step1(_frame(), num_classes=2, categorical=True)
+
+    assert all(isinstance(s, Step1Scenario) for s in results.scenarios)
+    for s in results.scenarios:
+        assert isinstance(df_cat[s.column_name].dtype, pd.CategoricalDtype)
+
+
+def test_compact_scenarios_survive_pickle_and_deepcopy():
+    _, results = create_immutable_step1(_frame(), num_classes=2, compact=True)
+    for clone in (pickle.loads(pickle.dumps(results)), copy.deepcopy(results)):
+        assert clone.scenarios == results.scenarios
+        assert all(isinstance(s, CompactStep1Scenario) for s in clone.scenarios)
+        assert clone.scenarios[0].get_assignment("Α") == results.scenarios[0].get_assignment("Α")
+
+
+def test_cache_hit_returns_the_requested_representation(tmp_path):
+    cache = Step1ResultsCache(tmp_path)
+    _, filled = create_immutable_step1(_frame(), num_classes=2, compact=True, cache=cache)
+    _, plain = create_immutable_step1(_frame(), num_classes=2, cache=cache)
+    _, compact = create_immutable_step1(_frame(), num_classes=2, compact=True, cache=cache)
+
+    assert all(isinstance(s, Step1Scenario) for s in plain.scenarios)
+    assert all(isinstance(s, CompactStep1Scenario) for s in compact.scenarios)
+    assert [s.assignments for s in plain.scenarios] == [dict(s.assignments) for s in filled.scenarios]
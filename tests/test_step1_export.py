@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from step1_immutable_ALLINONE import export_exact_multisheet
+
+
+def _frame_with_missing_values() -> pd.DataFrame:
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": pd.array(["Α", pd.NA, "Γ"], dtype="string"),
+        "ΗΛΙΚΙΑ": pd.array([7, pd.NA, 8], dtype="Int64"),
+        "ΒΑΘΜΟΣ": [1.5, np.nan, 2.0],
+        "ΗΜΕΡΟΜΗΝΙΑ": [pd.Timestamp("2024-09-01"), pd.NaT, pd.Timestamp("2024-09-02")],
+        "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1": ["Α1", None, "Α2"],
+        "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_2": ["Α2", "Α1", pd.NA],
+    })
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_export_writes_missing_values_as_blank_cells(tmp_path, streaming):
+    df = _frame_with_missing_values()
+    out = tmp_path / "step1.xlsx"
+    export_exact_multisheet(df, str(out), streaming=streaming)
+
+    sheets = pd.read_excel(out, sheet_name=None)
+    assert list(sheets) == ["ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1", "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_2"]
+    first = sheets["ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1"]
+    assert list(first.columns) == ["ΟΝΟΜΑ", "ΗΛΙΚΙΑ", "ΒΑΘΜΟΣ", "ΗΜΕΡΟΜΗΝΙΑ", "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1"]
+    assert first.iloc[1].isna().all()
+    assert first["ΗΛΙΚΙΑ"].tolist()[::2] == [7, 8]
+    assert first["ΗΜΕΡΟΜΗΝΙΑ"].iloc[2] == pd.Timestamp("2024-09-02")
+    assert pd.isna(sheets["ΒΗΜΑ1_ΣΕΝΑΡΙΟ_2"]["ΒΗΜΑ1_ΣΕΝΑΡΙΟ_2"].iloc[2])
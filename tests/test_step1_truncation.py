@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from step1_immutable_ALLINONE import Step1Budget, Step1ImmutableProcessor, _SearchMonitor
+
+KIDS = [f"K{i}" for i in range(7)]
+FRIENDSHIPS = frozenset({("K0", "K3"), ("K1", "K6"), ("K4", "K5"), ("K5", "K6")})
+
+
+def test_pruning_without_dropped_ties_is_not_truncation(capsys):
+    result = Step1ImmutableProcessor()._exhaustive_generation(KIDS, 3, FRIENDSHIPS)
+
+    out = capsys.readouterr().out
+    assert [broken for _, broken in result] == [1] * 5
+    assert "κλαδέματα: 0" not in out
+    assert "Περικοπή" not in out
+
+
+def test_dropped_tie_is_reported_as_truncation(capsys):
+    kids = [f"K{i}" for i in range(6)]
+    processor = Step1ImmutableProcessor()
+    result = processor._exhaustive_generation(kids, 2, frozenset())
+    assert [broken for _, broken in result] == [0] * 5
+    assert "Περικοπή" in capsys.readouterr().out
+
+    result = processor._component_generation(kids, 2, frozenset())
+    assert [broken for _, broken in result] == [0] * 5
+    assert "Περικοπή" in capsys.readouterr().out
+
+
+def test_tie_recount_does_not_consume_the_budget():
+    unbounded = _SearchMonitor()
+    expected = Step1ImmutableProcessor()._exhaustive_generation(KIDS, 3, FRIENDSHIPS, monitor=unbounded)
+
+    monitor = _SearchMonitor(Step1Budget(nodes=unbounded.nodes))
+    result = Step1ImmutableProcessor()._exhaustive_generation(KIDS, 3, FRIENDSHIPS, monitor=monitor)
+    assert result == expected
+    assert not monitor.exhausted
+    assert monitor.nodes == unbounded.nodes
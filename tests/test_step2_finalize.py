@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+import step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED as step2
+from step2_finalize import export_step2_minimal_nextcol, export_step2_nextcol_full
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "step1.xlsx"
+    pd.DataFrame({
+        "ΟΝΟΜΑ": ["Α", "Β", "Γ", "Δ"],
+        "ΦΥΛΟ": ["Α", "Κ", "Α", "Κ"],
+        "ΖΩΗΡΟΣ": ["Ν", "Ο", "Ν", "Ο"],
+        "ΙΔΙΑΙΤΕΡΟΤΗΤΑ": ["Ο", "Ν", "Ο", "Ο"],
+        "ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ": ["Ο"] * 4,
+        "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ": ["Ν"] * 4,
+        "ΦΙΛΟΙ": ["", "", "", ""],
+        "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1": [None, None, None, "Α1"],
+        "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_2": [None, None, None, "Α2"],
+    }).to_excel(path, index=False)
+    return path
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    recorded = []
+    real = step2.step2_apply_FIXED_v3
+
+    def spy(df, step1_col, *args, **kwargs):
+        recorded.append((step1_col, kwargs))
+        return real(df, step1_col, *args, **kwargs)
+
+    monkeypatch.setattr(step2, "step2_apply_FIXED_v3", spy)
+    return recorded
+
+
+@pytest.mark.parametrize("export", [export_step2_minimal_nextcol, export_step2_nextcol_full])
+def test_each_scenario_gets_its_own_stable_seed(workbook, tmp_path, calls, export):
+    export(str(workbook), str(tmp_path / "out.xlsx"), seed=10)
+    assert [(col, kw["seed"]) for col, kw in calls] == [("ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1", 11), ("ΒΗΜΑ1_ΣΕΝΑΡΙΟ_2", 12)]
+
+
+@pytest.mark.parametrize("export", [export_step2_minimal_nextcol, export_step2_nextcol_full])
+def test_search_budgets_reach_every_scenario(workbook, tmp_path, calls, export):
+    export(str(workbook), str(tmp_path / "out.xlsx"), time_budget=5.0, node_budget=1000)
+    assert [(kw["time_budget"], kw["node_budget"]) for _, kw in calls] == [(5.0, 1000)] * 2
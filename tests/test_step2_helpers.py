@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from step_2_helpers_FIXED import FriendshipIndex, are_mutual_friends, mutual_pairs_in_scope
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": ["Α", "Β", "Γ", "Δ", "Α"],
+        "ΦΙΛΟΙ": ["Β, Γ", "Α", "['Α', 'Δ']", "Β", "Δ"],
+    })
+
+
+def test_index_and_direct_lookup_agree():
+    df = _frame()
+    index = FriendshipIndex(df)
+    names = ["Α", "Β", "Γ", "Δ", "Ε"]
+    for a in names:
+        for b in names:
+            assert are_mutual_friends(df, a, b, index) == are_mutual_friends(df, a, b)
+
+
+def test_mutual_pairs_with_shared_index():
+    df = _frame()
+    index = FriendshipIndex(df)
+    scope = {"Α", "Β", "Γ", "Δ"}
+    assert mutual_pairs_in_scope(df, scope, index) == mutual_pairs_in_scope(df, scope) == [("Α", "Β"), ("Α", "Γ")]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import random
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from step_2_helpers_FIXED import FriendshipIndex
+from step3_amivaia_filia_FIXED import apply_step3_on_sheet
+
+COL2, COL3 = "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1", "ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"
+
+
+def _sheet(seed: int) -> pd.DataFrame:
+    """Δύο σχεδόν γεμάτα τμήματα, πυκνές αμοιβαίες φιλίες και διπλά ονόματα."""
+    r = random.Random(seed)
+    pool = [f"S{i}" for i in range(r.randint(40, 60))]
+    names = pool + [r.choice(pool) for _ in range(r.randint(1, 8))]
+    r.shuffle(names)
+    friends = {p: set(r.sample(pool, r.randint(0, 3))) for p in pool}
+    for p in pool:
+        for q in r.sample(pool, 2):
+            if r.random() < .6:
+                friends[p].add(q)
+                friends[q].add(p)
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": "Α",
+        "ΦΙΛΟΙ": [", ".join(sorted(friends[n])) for n in names],
+        COL2: [f"Α{r.randint(1, 2)}" if r.random() < .8 else np.nan for _ in names],
+    })
+
+
+def _kept_dyads(before: pd.DataFrame, after: pd.DataFrame) -> int:
+    """Δυάδες (νέος μαθητής, φίλος ήδη τοποθετημένος στο Βήμα 2) στο ίδιο τμήμα."""
+    graph = FriendshipIndex(before)
+    placed = {n: c for n, c in zip(before["ΟΝΟΜΑ"], before[COL2]) if pd.notna(c)}
+    newly = {n: c for n, old, c in zip(before["ΟΝΟΜΑ"], before[COL2], after[COL3])
+             if pd.isna(old) and pd.notna(c)}
+    return sum(1 for u, cl in newly.items() for v in set(graph.mutual_friends_of(u)) if placed.get(v) == cl)
+
+
+def _sparse_sheet(seed: int) -> pd.DataFrame:
+    """Αραιές αμοιβαίες φιλίες, μοναδικά ονόματα: δυάδες και ανάμεσα σε δύο νέους μαθητές."""
+    r = random.Random(seed)
+    names = [f"S{i}" for i in range(r.randint(8, 30))]
+    friends = {n: set() for n in names}
+    for _ in names:
+        a, b = r.sample(names, 2)
+        friends[a].add(b)
+        friends[b].add(a)
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": "Α",
+        "ΦΙΛΟΙ": [", ".join(sorted(friends[n])) for n in names],
+        COL2: [f"Α{r.randint(1, 2)}" if r.random() < .6 else np.nan for _ in names],
+    })
+
+
+@pytest.mark.parametrize("sheet", [_sheet(seed) for seed in range(20)] + [_sparse_sheet(248)])
+def test_flow_breaks_no_more_dyads_than_greedy(sheet):
+    before = Counter(c for c in sheet[COL2] if pd.notna(c))
+    greedy, greedy_meta = apply_step3_on_sheet(sheet, COL2)
+    flow, flow_meta = apply_step3_on_sheet(sheet, COL2, mode="flow")
+
+    assert flow_meta["broken"] <= greedy_meta["broken"]
+    if flow_meta["broken"] == greedy_meta["broken"]:
+        assert _kept_dyads(sheet, flow) >= _kept_dyads(sheet, greedy)
+    for result in (greedy, flow):
+        after = Counter(c for c in result[COL3] if pd.notna(c))
+        assert all(after[c] <= max(25, before[c]) for c in after)
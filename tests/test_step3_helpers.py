@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from step_2_helpers_FIXED import FriendshipIndex
+from step_3_helpers_FIXED import are_mutual_pair, mutual_dyads
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": ["Α", "Β", "Γ", "Δ", "Δ"],
+        "ΦΙΛΟΙ": ["Β, Γ", "Α", "Β", "Δ", ""],
+    })
+
+
+def test_pair_lookup_with_and_without_index():
+    df = _frame()
+    graph = FriendshipIndex(df)
+    names = ["Α", "Β", "Γ", "Δ", "Ε"]
+    for a in names:
+        for b in names:
+            assert are_mutual_pair(df, a, b, graph) == are_mutual_pair(df, a, b)
+
+
+def test_dyads_keep_self_pair_of_repeated_name():
+    df = _frame()
+    assert mutual_dyads(df) == mutual_dyads(df, FriendshipIndex(df)) == {("Α", "Β"), ("Δ", "Δ")}